@@ -10,8 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
+load_dotenv()
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -75,12 +80,54 @@ WSGI_APPLICATION = 'GamblingBot.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgres - продакшн профіль з пулом з'єднань (psycopg[pool]),
+# за замовчуванням SQLite
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'gamblingbot'),
+            'USER': os.getenv('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            # з пулом з'єднання повертаються в пул після кожного виклику, а не
+            # тримаються потоком (Django не дозволяє pool разом з CONN_MAX_AGE > 0)
+            'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('POSTGRES_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.getenv('POSTGRES_POOL_MAX_SIZE', 20)),
+                    'timeout': 10,
+                },
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            # кожен потік пулу bot/db.py тримає своє з'єднання весь час роботи,
+            # а не відкриває нове (і не виконує PRAGMA) на кожен запит
+            'CONN_MAX_AGE': None,
+            'OPTIONS': {
+                # WAL - читання не блокуються записом
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+                # скільки секунд чекати, поки інший процес звільнить базу
+                'timeout': int(os.getenv('SQLITE_TIMEOUT', 20)),
+                # блокування на запис береться на початку транзакції, а не посередині
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
     }
-}
+
+# runbots пише в базу через одну чергу пакетними транзакціями (bot/db.py),
+# за замовчуванням увімкнено для SQLite
+DB_WRITE_QUEUE = os.getenv('DB_WRITE_QUEUE', '1' if DB_ENGINE == 'sqlite' else '0') == '1'
 
 
 # Password validation
@@ -122,9 +169,8 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-
 BOT_USERNAME = os.getenv('BOT_USERNAME')
+REDIS_DSN = os.getenv('REDIS_DSN', 'redis://127.0.0.1:6379')
+# lazy - повідомлення після старту рахуються від User.joined_at та User.drip_cursor
+# rows - для кожного користувача створюються рядки MessageAfterStart
+DRIP_MODE = os.getenv('DRIP_MODE', 'lazy')
@@ -1,13 +1,24 @@
-import asyncio
 import logging
-from urllib.parse import parse_qs
+import tempfile
+from urllib.parse import parse_qs, urlencode
 
+from django import forms
 from django.contrib import admin, messages
 from django.http import HttpRequest, HttpResponse
 from django.template.response import TemplateResponse
+from django.db.models import Sum
+from django.urls import path
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 from .models import *
-from .utils import check_bot
+from .tasks import get_bot_info
+from .counters import get_status_stats
+from .rollups import EVENTS, LEADERBOARD_ORDERING, get_bloger_leaderboard
+from .exports import export_users, export_broadcasts
+from .imports import copy_users, import_file, log_progress, run_in_background
+from .pagination import EstimatedCountPaginator, CursorChangeList
+from .nav_cache import get_nav_tree
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -22,6 +33,16 @@ if not logger.handlers:
     logger.addHandler(console_handler)
 
 
+def _int_param(request, name):
+    """
+    Ціле значення параметра запиту або None, якщо його немає чи воно некоректне
+    """
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+
+
 class BotRelatedAdmin(admin.ModelAdmin):
     exclude = ('bot',)
 
@@ -31,7 +52,7 @@ class BotRelatedAdmin(admin.ModelAdmin):
         elif self.model.__name__ == 'Message':
             return ('text', 'button_text')
         elif self.model.__name__ == 'ScheduledMessage':
-            return('text', 'button_text', 'send_at', 'sent')
+            return('text', 'button_text', 'send_at', 'sent', 'delivered', 'failed')
         elif self.model.__name__ == 'Campain':
             return ('text', 'button_text', 'delay_minutes')
 
@@ -85,41 +106,76 @@ class BotRelatedAdmin(admin.ModelAdmin):
 class MyAdminSite(admin.AdminSite):
     site_header = "Управління гемблінговими ботами"
 
-    def get_app_list(self, request):
-        folders = Folder.objects.prefetch_related("bots")
-        app_list = []
+    def get_app_list(self, request, app_label=None):
+        # кешується до зміни папок або ботів (nav_cache)
+        return get_nav_tree()
 
-        for folder in folders:
-            folder_dict = {
-                "name": folder.name,
-                "id": f"folder_{folder.id}",
-                "bots": [],
-                "folder_id": folder.id
-            }
+    
+class ImportUsersForm(forms.Form):
+    source_bot = forms.ModelChoiceField(
+        Bot.objects.all(), required=False, label='Скопіювати аудиторію та блогерів з бота'
+    )
+    file = forms.FileField(required=False, label='Або файл з експорту користувачів')
+    format = forms.ChoiceField(
+        choices=(('csv', 'CSV'), ('ndjson', 'NDJSON')), label='Формат файлу'
+    )
+
+    def clean(self):
+        data = super().clean()
+        if bool(data.get('source_bot')) == bool(data.get('file')):
+            raise forms.ValidationError('Оберіть бота або файл')
+        return data
 
-            for bot in folder.bots.all():
-                folder_dict["bots"].append({
-                    "name": bot.name,
-                    "app_label": f"bot_{bot.id}",
-                    "bot_id": bot.id,
-                    "models": [
-                        {"name": "Користувачі", "admin_url": f"/admin/bot/user/?bot__id__exact={bot.id}"},
-                        {"name": "Повідомлення", "admin_url": f"/admin/bot/message/?bot__id__exact={bot.id}"},
-                        {"name": "Блогери", "admin_url": f"/admin/bot/bloger/?bot__id__exact={bot.id}"},
-                        {"name": "Заплановані повідомлення", "admin_url": f"/admin/bot/scheduledmessage/?bot__id__exact={bot.id}"},
-                        {"name": "Повідомлення після старту", "admin_url": f"/admin/bot/campain/?bot__id__exact={bot.id}"},
-                        {"name": "Статистика", "admin_url": f"/admin/bot/botstatistics/?bot__id__exact={bot.id}"},
-                    ]
-                })
-            app_list.append(folder_dict)
-
-        return app_list
 
-    
 class BotAdmin(BotRelatedAdmin):
+    actions = ('import_audience',)
+
+    @admin.action(description='Імпортувати користувачів')
+    def import_audience(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, 'Оберіть одного бота для імпорту', level=messages.ERROR)
+            return None
+        target = queryset.get()
+
+        form = ImportUsersForm(request.POST if 'apply' in request.POST else None, request.FILES or None)
+        if 'apply' in request.POST and form.is_valid():
+            source = form.cleaned_data['source_bot']
+            if source:
+                if source.pk == target.pk:
+                    self.message_user(request, 'Бот-джерело збігається з цільовим', level=messages.ERROR)
+                    return None
+                run_in_background(copy_users, source, target, log_progress)
+            else:
+                # завантажений файл існує лише під час запиту
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.import') as tmp:
+                    for chunk in form.cleaned_data['file'].chunks():
+                        tmp.write(chunk)
+                run_in_background(import_file, target, tmp.name, form.cleaned_data['format'], cleanup_path=tmp.name)
+
+            self.message_user(
+                request,
+                f'Імпорт у бота {target.name} запущено, хід виконання - в логах',
+                level=messages.SUCCESS,
+            )
+            return None
+
+        context = self.admin_site.each_context(request)
+        context.update({
+            'title': f'Імпорт користувачів у бота "{target.name}"',
+            'form': form,
+            'target': target,
+            'action_checkbox_name': admin.helpers.ACTION_CHECKBOX_NAME,
+        })
+        return TemplateResponse(request, 'admin/import_users.html', context)
+
     def save_model(self, request, obj, form, change):
+        # токен не змінився - бот уже перевірено при попередньому збереженні
+        if change and 'token' not in form.changed_data and obj.bot_id and obj.username:
+            super().save_model(request, obj, form, change)
+            return
+
         try:
-            bot_info = asyncio.run(check_bot(obj.token))
+            bot_info = get_bot_info(obj.token)
             obj.bot_id = bot_info.id
             obj.username = bot_info.username
             logging.info(f'Bot username {bot_info.username}')
@@ -138,9 +194,146 @@ class BlogerAdmin(BotRelatedAdmin):
     list_display = ('name', 'invited_people', 'ref_link_to_site', 'ref_link_to_bot')
     list_editable = ('ref_link_to_site',)
 
+    def get_urls(self):
+        urls = [
+            path(
+                'leaderboard/',
+                self.admin_site.admin_view(self.leaderboard_view),
+                name='bot_bloger_leaderboard',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def leaderboard_view(self, request: HttpRequest):
+        """
+        Рейтинг блогерів за період - з DailyStat, без підрахунку користувачів
+        """
+        bot_id = _int_param(request, 'bot__id__exact')
+        folder_id = _int_param(request, 'folder__id__exact')
+
+        today = timezone.localdate()
+        days = request.GET.get('days')
+        date_to = parse_date(request.GET.get('to') or '') or today
+        if days and days.isdigit():
+            date_from = date_to - timezone.timedelta(days=int(days) - 1)
+        else:
+            date_from = parse_date(request.GET.get('from') or '') or date_to - timezone.timedelta(days=29)
+
+        bot_pks = None
+        if bot_id:
+            bot_pks = [bot_id]
+        elif folder_id:
+            bot_pks = list(Bot.objects.filter(folder_id=folder_id).values_list('pk', flat=True))
+
+        order = request.GET.get('o', 'joins')
+        filters = {
+            key: value for key, value in (('bot__id__exact', bot_id), ('folder__id__exact', folder_id))
+            if value is not None
+        }
+        query = urlencode({**filters, 'from': date_from, 'to': date_to})
+        # повторне натискання на колонку сортує у зворотному порядку
+        columns = [
+            {
+                'label': label,
+                'url': f'?{query}&o={"-" if order == key else ""}{key}',
+                'active': order.lstrip('-') == key,
+            }
+            for key, label in zip(LEADERBOARD_ORDERING, (
+                'Приєднались', 'Приріст', 'Блокувань на 100 приєднань',
+                'Завершень на 100 приєднань', 'Заблокували', 'Отримали всі повідомлення',
+            ))
+        ]
+
+        context = self.admin_site.each_context(request)
+        context.update({
+            'stat_title': '🏆 Рейтинг блогерів',
+            'leaderboard': get_bloger_leaderboard(date_from, date_to, bot_pks, order),
+            'columns': columns,
+            'date_from': date_from,
+            'date_to': date_to,
+            'filters': filters,
+            'range_days': (7, 30, 90),
+        })
+        return TemplateResponse(request, 'admin/bloger_leaderboard.html', context)
+
 class FolderAdmin(BotRelatedAdmin):
     list_display = ('name', )
 
+class LargeTableAdmin(BotRelatedAdmin):
+    """
+    Список для великих таблиць: без повного COUNT(*), з сортуванням за -pk
+    і посиланням на наступну сторінку через id__lt замість OFFSET
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-pk',)
+    # поля, які завантажує список (QuerySet.only)
+    list_only = None
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            estimate=self.estimate_count(request),
+        )
+
+    def estimate_count(self, request):
+        return None
+
+class UserAdmin(LargeTableAdmin):
+    actions = ('export_csv', 'export_ndjson')
+    list_select_related = ('bloger',)
+    list_only = ('telegram_id', 'username', 'first_name', 'bot', 'bloger__name')
+    search_fields = ('=telegram_id', '=username')
+    search_help_text = 'Телеграм ID або юзернейм (точний збіг)'
+
+    def estimate_count(self, request):
+        # без пошуку та фільтрів кількість відома з лічильників статусів
+        if set(request.GET) - {'bot__id__exact', 'p', 'o'}:
+            return None
+        bot_id = request.GET.get('bot__id__exact')
+        return sum(get_status_stats([bot_id] if bot_id else None).values())
+
+    def get_search_results(self, request, queryset, search_term):
+        # точний збіг по індексах (bot, telegram_id) та (bot, username)
+        term = search_term.strip().lstrip('@')
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(telegram_id=int(term)), False
+        return queryset.filter(username=term), False
+
+    @admin.action(description='Експортувати в CSV')
+    def export_csv(self, request, queryset):
+        return export_users(queryset, 'csv')
+
+    @admin.action(description='Експортувати в NDJSON')
+    def export_ndjson(self, request, queryset):
+        return export_users(queryset, 'ndjson')
+
+class ScheduledMessageAdmin(BotRelatedAdmin):
+    actions = ('export_csv', 'export_ndjson')
+
+    @admin.action(description='Експортувати результати в CSV')
+    def export_csv(self, request, queryset):
+        return export_broadcasts(queryset, 'csv')
+
+    @admin.action(description='Експортувати результати в NDJSON')
+    def export_ndjson(self, request, queryset):
+        return export_broadcasts(queryset, 'ndjson')
+
+class MessageAfterStartAdmin(LargeTableAdmin):
+    list_display = ('telegram_id', 'text', 'send_at', 'sent')
+    list_select_related = ('user',)
+    list_only = ('text', 'send_at', 'sent', 'bot', 'user__telegram_id')
+    raw_id_fields = ('user',)
+
+    @admin.display(description='Телеграм ID')
+    def telegram_id(self, obj):
+        return obj.user.telegram_id
+
 class BotStatisticsAdmin(BotRelatedAdmin):
     change_list_template = "admin/statistics.html"
 
@@ -151,85 +344,122 @@ class BotStatisticsAdmin(BotRelatedAdmin):
         context = self.admin_site.each_context(request)
         logger.info(f'Bot ID {bot_id}')
 
+        # рахується з лічильників UserStatusCounter - по рядку на бота і статус
         if bot_id:
-            active_percent = 0
-            users = User.objects.filter(bot_id=bot_id)
             bot = Bot.objects.filter(id=bot_id).first()
-            logger.info(f'Users count for bot {bot.name}: {len(users)}')
             title = f'📊 Статистика по боту "{bot.name}"'
-
-            stats = users.values('status').annotate(count=models.Count('status'))
-
-            stat_dict = {s['status']: s['count'] for s in stats}   
-            total = sum(stat_dict.values())
-            logger.info(f'Bot stats: {stats}')
-
-            # відсоток активних користувачів
-            active_count = stat_dict.get("active", 0)
-            if total > 0:
-                active_percent = round((active_count / total) * 100, 2)
-
-            context.update({
-                'bot_stats': stat_dict,
-                'bot': bot,
-                'active_percent': active_percent,
-                'stat_title': title
-            })
+            stat_dict = get_status_stats([bot.pk])
+            context['bot'] = bot
         elif folder_id:
-            active_percent = 0
             folder = Folder.objects.get(id=folder_id)
-            users = User.objects.filter(bot__in=folder.bots.all())
-            
-            logger.info(f'Users count for bot {folder.name}: {len(users)}')
             title = f'📊 Статистика по папці "{folder.name}"'
-
-            stats = users.values('status').annotate(count=models.Count('status'))
-
-            stat_dict = {s['status']: s['count'] for s in stats}   
-            total = sum(stat_dict.values())
-            logger.info(f'Bot stats: {stats}')
-
-            active_count = stat_dict.get("active", 0)
-            if total > 0:
-                active_percent = round((active_count / total) * 100, 2)
-
-            context.update({
-                'bot_stats': stat_dict,
-                'active_percent': active_percent,
-                'stat_title': title
-            })
-
+            stat_dict = get_status_stats(folder.bots.values_list('pk', flat=True))
         else:
             title = f'📊 Статистика всіх ботів'
-            users = User.objects.all()
+            stat_dict = get_status_stats()
 
-            stats = users.values('status').annotate(count=models.Count('status'))
-            stat_dict = {s['status']: s['count'] for s in stats}
-            total = sum(stat_dict.values())
+        logger.info(f'Bot stats: {stat_dict}')
 
-            if total > 0:
-                active_percent = round((stat_dict.get('active', 0) / total) * 100, 2)
+        # відсоток активних користувачів
+        active_percent = 0
+        total = sum(stat_dict.values())
+        if total > 0:
+            active_percent = round((stat_dict.get('active', 0) / total) * 100, 2)
 
-            context.update({
-                'bot_stats': stat_dict,
-                'active_percent': active_percent,
-                'stat_title': title
-            })
+        context.update({
+            'bot_stats': stat_dict,
+            'active_percent': active_percent,
+            'stat_title': title
+        })
 
         return TemplateResponse(
             request,
             self.change_list_template,
             context,
         )
+
+    def get_urls(self):
+        urls = [
+            path(
+                'chart/',
+                self.admin_site.admin_view(self.chart_view),
+                name='bot_botstatistics_chart',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def chart_view(self, request: HttpRequest):
+        """
+        Графік подій за період - лише з HourlyStat/DailyStat, без таблиці користувачів
+        """
+        bot_id = _int_param(request, 'bot__id__exact')
+        folder_id = _int_param(request, 'folder__id__exact')
+        bloger_id = _int_param(request, 'bloger')
+
+        today = timezone.localdate()
+        date_to = parse_date(request.GET.get('to') or '') or today
+        date_from = parse_date(request.GET.get('from') or '') or date_to - timezone.timedelta(days=13)
+
+        # один день - по годинах, інакше по днях
+        if date_from == date_to:
+            start = timezone.make_aware(timezone.datetime.combine(date_from, timezone.datetime.min.time()))
+            rows = HourlyStat.objects.filter(hour__gte=start, hour__lt=start + timezone.timedelta(days=1))
+            period = 'hour'
+        else:
+            rows = DailyStat.objects.filter(day__range=(date_from, date_to))
+            period = 'day'
+
+        if bot_id:
+            rows = rows.filter(bot_id=bot_id)
+        elif folder_id:
+            rows = rows.filter(bot__folder_id=folder_id)
+        if bloger_id:
+            rows = rows.filter(bloger_id=bloger_id)
+
+        series = list(
+            rows.values(period).annotate(**{event: Sum(event) for event in EVENTS}).order_by(period)
+        )
+        peaks = {event: max((row[event] for row in series), default=0) or 1 for event in EVENTS}
+
+        chart = []
+        for row in series:
+            label = row[period]
+            label = timezone.localtime(label).strftime('%H:00') if period == 'hour' else label.strftime('%d.%m')
+            chart.append({
+                'label': label,
+                'values': [
+                    {'count': row[event], 'percent': round(row[event] * 100 / peaks[event])}
+                    for event in EVENTS
+                ],
+            })
+
+        context = self.admin_site.each_context(request)
+        context.update({
+            'stat_title': '📈 Події за період',
+            'events': [DailyStat._meta.get_field(event).verbose_name for event in EVENTS],
+            'totals': [sum(row[event] for row in series) for event in EVENTS],
+            'chart': chart,
+            'date_from': date_from,
+            'date_to': date_to,
+            'filters': {
+                key: value
+                for key, value in (
+                    ('bot__id__exact', bot_id), ('folder__id__exact', folder_id), ('bloger', bloger_id),
+                )
+                if value is not None
+            },
+        })
+        return TemplateResponse(request, 'admin/statistics_chart.html', context)
         
 
 admin_site = MyAdminSite(name='myadmin')
 
 admin_site.register(BotStatistics, BotStatisticsAdmin)
-admin_site.register(User, BotRelatedAdmin)
+admin_site.register(User, UserAdmin)
 admin_site.register(Message, BotRelatedAdmin)
 admin_site.register(Bloger, BlogerAdmin)
-admin_site.register(ScheduledMessage, BotRelatedAdmin)
+admin_site.register(ScheduledMessage, ScheduledMessageAdmin)
 admin_site.register(Campain, BotRelatedAdmin)
+admin_site.register(MessageAfterStart, MessageAfterStartAdmin)
 admin_site.register(Bot, BotAdmin)
 admin_site.register(Folder, FolderAdmin)
\ No newline at end of file
@@ -1,65 +1,232 @@
 import os
 import asyncio
 import logging
+from contextlib import suppress
 from dotenv import load_dotenv
-from asgiref.sync import sync_to_async
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.jobstores.redis import RedisJobStore
+from django.conf import settings
 
 from aiogram import Bot as AiogramBot, Dispatcher
-from aiogram.types import MenuButtonWebApp, WebAppInfo
+from aiogram.methods import GetUpdates
+from aiogram.exceptions import TelegramUnauthorizedError
+from aiogram.utils.backoff import Backoff
+from aiogram.dispatcher.dispatcher import DEFAULT_BACKOFF_CONFIG
 from aiogram.client.default import DefaultBotProperties
 from aiogram.fsm.storage.redis import RedisStorage, DefaultKeyBuilder
 
 from .models import Bot
-from .handlers import create_router  
+from .db import db_async
+from .handlers import create_router
+from .context import bot_contexts, register_bot, unregister_bot, find_bot_context
+from .control import listen_control
+from .user_cache import user_cache
+from .middlewares import (
+    BotContextMiddleware, ThrottlingMiddleware, MetricsMiddleware, HandlerNameMiddleware,
+    get_throttle_backend,
+)
+from .metrics import METRICS_ENABLED, telegram_request_timer
+from .remote_config import apply_remote_config, remote_config_hash
+from .profiler import PROFILER_ACTIONS, handle_profiler_command
 
 load_dotenv()
-redis_dsn = os.getenv('REDIS_DSN')
+redis_dsn = settings.REDIS_DSN
+# Скільки ботів налаштовується одночасно під час старту
+STARTUP_CONCURRENCY = int(os.getenv('BOTS_STARTUP_CONCURRENCY', 20))
+# Як часто (сек) звіряти запущених ботів з базою на випадок втрачених команд
+SYNC_INTERVAL = int(os.getenv('BOTS_SYNC_INTERVAL', 60))
+POLLING_TIMEOUT = 10
+
+# Задачі обробки апдейтів, щоб їх не прибрав garbage collector
+update_tasks = set()
 redis_jobstore = RedisJobStore(host='localhost', port=6379, db=0)
 scheduler = AsyncIOScheduler(
     jobstores={'default': redis_jobstore},
     timezone='Europe/Kyiv'
 )
 
+# Один Dispatcher, роутер і пул Redis для всіх ботів.
+# Ключі FSM розділяються по ботах через with_bot_id=True
+storage = RedisStorage.from_url(redis_dsn, key_builder=DefaultKeyBuilder(with_bot_id=True))
+dp = Dispatcher(storage=storage)
+dp.update.outer_middleware(BotContextMiddleware())
+if METRICS_ENABLED:
+    dp.update.outer_middleware(MetricsMiddleware())
+    dp.message.middleware(HandlerNameMiddleware())
+    dp.callback_query.middleware(HandlerNameMiddleware())
+dp.update.outer_middleware(ThrottlingMiddleware(backend=get_throttle_backend()))
+dp.include_router(create_router())
+
 async def setup_bot(bot_obj):
     """
-    Створює Aiogram Bot та Dispatcher для одного бота
+    Створює Aiogram Bot для одного бота та реєструє його контекст
     """
     bot_instance = AiogramBot(
         token=bot_obj.token,
         default=DefaultBotProperties(parse_mode='HTML')
     )
-    if bot_obj.miniapp_link:
-        await bot_instance.set_chat_menu_button(
-            menu_button=MenuButtonWebApp(
-                text=bot_obj.button_text,
-                web_app=WebAppInfo(url=bot_obj.miniapp_link)
-            )
+    if METRICS_ENABLED:
+        bot_instance.session.middleware(telegram_request_timer)
+    try:
+        if await apply_remote_config(bot_obj, bot_instance):
+            logging.info(f"Оновлено налаштування Telegram для бота {bot_obj.name}")
+    except Exception:
+        await bot_instance.session.close()
+        raise
+
+    return register_bot(bot_obj, bot_instance)
+
+async def process_update(bot_ctx, update):
+    bot_instance = bot_ctx.tg_bot
+    try:
+        await dp.feed_update(bot_instance, update)
+    except Exception as e:
+        logging.error(
+            f"Помилка обробки апдейту {update.update_id} ботом {bot_instance.id}: {e}",
+            exc_info=True
         )
-        
-    await bot_instance.delete_webhook()
-    storage = RedisStorage.from_url(redis_dsn, key_builder=DefaultKeyBuilder(with_bot_id=True))
-    dp_instance = Dispatcher(storage=storage)
-    
-    dp_instance.include_router(create_router())
-    
-    return bot_instance, dp_instance
+
+def spawn_update(bot_ctx, update):
+    """
+    Запускає обробку апдейту окремою задачею. Слот семафора бота вже зайнятий
+    і звільняється, коли задача завершиться - навіть якщо її скасували до старту
+    (зупинка бота), інакше слот було б втрачено назавжди
+    """
+    task = asyncio.create_task(process_update(bot_ctx, update))
+    update_tasks.add(task)
+    task.add_done_callback(update_tasks.discard)
+    task.add_done_callback(lambda _: bot_ctx.semaphore.release())
+    return task
+
+async def poll_bot(bot_ctx):
+    """
+    Long polling одного бота через спільний Dispatcher.
+    Коли зайняті всі BOT_CONCURRENCY слоти, нові апдейти не забираються
+    з Telegram, доки не звільниться слот
+    """
+    bot_instance = bot_ctx.tg_bot
+    backoff = Backoff(config=DEFAULT_BACKOFF_CONFIG)
+    get_updates = GetUpdates(
+        timeout=POLLING_TIMEOUT,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+    request_timeout = int(bot_instance.session.timeout + POLLING_TIMEOUT)
+
+    while True:
+        try:
+            updates = await bot_instance(get_updates, request_timeout=request_timeout)
+        except TelegramUnauthorizedError as e:
+            logging.error(f"Бот {bot_instance.id} більше не авторизований, polling зупинено: {e}")
+            return
+        except Exception as e:
+            logging.error(f"Не вдалося отримати апдейти для бота {bot_instance.id}: {e}")
+            await backoff.asleep()
+            continue
+
+        backoff.reset()
+        for update in updates:
+            await bot_ctx.semaphore.acquire()
+            spawn_update(bot_ctx, update)
+            get_updates.offset = update.update_id + 1
+
+async def start_bot(bot_obj):
+    bot_ctx = await setup_bot(bot_obj)
+    bot_ctx.task = asyncio.create_task(poll_bot(bot_ctx))
+    logging.info(f"Бот {bot_obj.name} запущено")
+    return bot_ctx
+
+async def stop_bot(bot_pk):
+    bot_ctx = find_bot_context(bot_pk)
+    if not bot_ctx:
+        return
+
+    unregister_bot(bot_ctx.tg_bot.id)
+    if bot_ctx.task:
+        bot_ctx.task.cancel()
+        with suppress(asyncio.CancelledError):
+            await bot_ctx.task
+    await bot_ctx.tg_bot.session.close()
+    logging.info(f"Бот {bot_ctx.bot.name} зупинено")
+
+async def reload_bot(bot_pk):
+    """
+    Перезапускає бота з актуальними даними з бази або зупиняє, якщо його видалили
+    """
+    bot_obj = await db_async(
+        Bot.objects.select_related('folder').filter(pk=bot_pk).first
+    )()
+    await stop_bot(bot_pk)
+    if bot_obj:
+        await start_bot(bot_obj)
+
+async def handle_control(command):
+    action = command.get("action")
+    bot_pk = command.get("bot_pk")
+
+    if action == "reload":
+        await reload_bot(bot_pk)
+    elif action == "stop":
+        await stop_bot(bot_pk)
+    elif action == "invalidate_user":
+        user_cache.invalidate(bot_pk, command.get("telegram_id"))
+    elif action in PROFILER_ACTIONS:
+        await handle_profiler_command(command)
+    else:
+        logging.warning(f"Невідома команда: {command}")
+
+async def sync_bots():
+    """
+    Звіряє запущених ботів з базою: запускає нових, зупиняє видалених,
+    перезапускає змінених
+    """
+    bots = await db_async(list)(Bot.objects.select_related('folder'))
+    db_bots = {bot_obj.pk: bot_obj for bot_obj in bots}
+    running = {bot_ctx.bot.pk: bot_ctx for bot_ctx in list(bot_contexts.values())}
+
+    for bot_pk in running.keys() - db_bots.keys():
+        await stop_bot(bot_pk)
+
+    for bot_pk, bot_obj in db_bots.items():
+        bot_ctx = running.get(bot_pk)
+        if bot_ctx and not bot_changed(bot_ctx.bot, bot_obj) and not bot_ctx.task.done():
+            bot_ctx.bot = bot_obj
+            # кнопка меню, якщо адмінка не змогла застосувати її сама
+            if bot_obj.remote_config_hash != remote_config_hash(bot_obj):
+                try:
+                    await apply_remote_config(bot_obj, bot_ctx.tg_bot)
+                except Exception as e:
+                    logging.error(f"Не вдалося оновити меню бота {bot_obj.name}: {e}")
+            continue
+        try:
+            await stop_bot(bot_pk)
+            await start_bot(bot_obj)
+        except Exception as e:
+            logging.error(f"Не вдалося запустити бота {bot_obj.name}: {e}")
+
+def bot_changed(old, new):
+    # решту полів бот бере з кешу конфігурації, кнопку меню застосовує адмінка
+    return old.token != new.token
 
 async def start_all_bots():
-    bots = await sync_to_async(list)(Bot.objects.all())
+    bots = await db_async(list)(Bot.objects.select_related('folder'))
     if not bots:
         logging.warning("Ботів у базі не знайдено!")
-        return
 
-    tasks = []
-    for bot_obj in bots:
-        bot_instance, dp_instance = await setup_bot(bot_obj)
-        tasks.append(dp_instance.start_polling(bot_instance))  # bot передається тут
+    semaphore = asyncio.Semaphore(STARTUP_CONCURRENCY)
+
+    async def start_with_limit(bot_obj):
+        async with semaphore:
+            try:
+                return await start_bot(bot_obj)
+            except Exception as e:
+                logging.error(f"Не вдалося запустити бота {bot_obj.name}: {e}")
+                return None
 
-    logging.info(f"Запуск {len(tasks)} ботів...")
-    await asyncio.gather(*tasks)
+    results = await asyncio.gather(*(start_with_limit(bot_obj) for bot_obj in bots))
+    logging.info(f"Запущено {len([r for r in results if r])} з {len(bots)} ботів")
 
-async def setup_and_start(bot: Bot):
-    bot_instance, dp_instance = await setup_bot(bot)
-    await dp_instance.start_polling(bot_instance)
+    try:
+        await listen_control(handle_control, sync_bots, idle_interval=SYNC_INTERVAL)
+    finally:
+        for bot_ctx in list(bot_contexts.values()):
+            await stop_bot(bot_ctx.bot.pk)
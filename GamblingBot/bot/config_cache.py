@@ -0,0 +1,138 @@
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+import redis
+
+from .models import Bot, Bloger, Campain, Message as DbMessage
+from .db import db_async
+from .control import get_redis, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# Лічильник версії в Redis: адмінка збільшує його при зміні налаштувань,
+# runbots періодично перевіряє і скидає свій кеш
+CONFIG_VERSION_KEY = "bots:config:version"
+VERSION_CHECK_INTERVAL = 5
+
+
+@dataclass
+class BotConfig:
+    """
+    Налаштування одного бота, потрібні хендлерам /start та колбеків
+    """
+    bot: Bot
+    first_message: DbMessage | None
+    main_message: DbMessage | None
+    digit_messages: list[DbMessage] = field(default_factory=list)
+    campains: list[Campain] = field(default_factory=list)
+    blogers: dict[int, Bloger] = field(default_factory=dict)
+
+
+_configs: dict[int, BotConfig] = {}
+_term_message = {}
+_load_locks: dict[int, asyncio.Lock] = {}
+_version = None
+_checked_at = 0.0
+_generation = 0
+
+
+def clear_config_cache():
+    global _generation
+    _generation += 1
+    _configs.clear()
+    _term_message.clear()
+
+
+def bump_config_version():
+    """
+    Скидає кеш у поточному процесі та в усіх процесах runbots
+    """
+    clear_config_cache()
+    try:
+        get_redis().incr(CONFIG_VERSION_KEY)
+    except redis.RedisError as e:
+        logger.error(f"Не вдалося оновити версію налаштувань: {e}")
+
+
+async def _check_version():
+    global _version, _checked_at
+
+    now = time.monotonic()
+    if now - _checked_at < VERSION_CHECK_INTERVAL:
+        return
+    _checked_at = now
+
+    try:
+        version = await get_async_redis().get(CONFIG_VERSION_KEY)
+    except redis.RedisError as e:
+        logger.error(f"Не вдалося перевірити версію налаштувань: {e}")
+        clear_config_cache()
+        return
+
+    if version != _version:
+        _version = version
+        clear_config_cache()
+
+
+def load_bot_config(bot_pk: int) -> BotConfig:
+    bot = Bot.objects.select_related("folder").get(pk=bot_pk)
+
+    if bot.use_our_messages:
+        messages = DbMessage.objects.filter(bot=bot)
+        campains = Campain.objects.filter(bot=bot)
+    else:
+        messages = DbMessage.objects.filter(folder=bot.folder)
+        campains = Campain.objects.filter(folder=bot.folder)
+
+    messages = list(messages.order_by("pk"))
+    blogers = list(Bloger.objects.filter(bot=bot))
+    for bloger in blogers:
+        bloger.bot = bot
+
+    return BotConfig(
+        bot=bot,
+        first_message=next(
+            (m for m in messages if not m.message_for_digits), None
+        ),
+        main_message=next(
+            (m for m in messages if not m.message_for_digits and not m.send_digits),
+            None,
+        ),
+        digit_messages=[m for m in messages if m.message_for_digits],
+        campains=list(campains.order_by("pk")),
+        blogers={bloger.pk: bloger for bloger in blogers},
+    )
+
+
+async def get_bot_config(bot_pk: int) -> BotConfig:
+    await _check_version()
+
+    config = _configs.get(bot_pk)
+    if config:
+        return config
+
+    lock = _load_locks.setdefault(bot_pk, asyncio.Lock())
+    async with lock:
+        config = _configs.get(bot_pk)
+        if not config:
+            generation = _generation
+            config = await db_async(load_bot_config)(bot_pk)
+            # кеш могли скинути, поки йшов запит до бази
+            if generation == _generation:
+                _configs[bot_pk] = config
+    return config
+
+
+async def get_term_message():
+    await _check_version()
+
+    if "message" in _term_message:
+        return _term_message["message"]
+
+    generation = _generation
+    message = await db_async(DbMessage.objects.filter(term=True).first)()
+    if generation == _generation:
+        _term_message["message"] = message
+    return message
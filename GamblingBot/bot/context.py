@@ -0,0 +1,50 @@
+import os
+import asyncio
+from dataclasses import dataclass, field
+
+from aiogram import Bot as AiogramBot
+
+from .models import Bot
+from .ratelimit import RateLimiter
+
+# Скільки апдейтів одного бота може оброблятись одночасно
+BOT_CONCURRENCY = int(os.getenv('BOT_CONCURRENCY', 20))
+
+
+@dataclass
+class BotContext:
+    """
+    Дані одного бота, які middleware передає в хендлери як `bot_ctx`
+    """
+    bot: Bot
+    tg_bot: AiogramBot
+    task: asyncio.Task | None = None
+    limiter: RateLimiter = field(default_factory=RateLimiter)
+    semaphore: asyncio.Semaphore = field(
+        default_factory=lambda: asyncio.Semaphore(BOT_CONCURRENCY)
+    )
+
+
+# telegram bot_id -> BotContext
+bot_contexts: dict[int, BotContext] = {}
+
+
+def register_bot(bot_obj: Bot, tg_bot: AiogramBot) -> BotContext:
+    ctx = BotContext(bot=bot_obj, tg_bot=tg_bot)
+    bot_contexts[tg_bot.id] = ctx
+    return ctx
+
+
+def unregister_bot(tg_bot_id: int):
+    return bot_contexts.pop(tg_bot_id, None)
+
+
+def get_bot_context(tg_bot_id: int):
+    return bot_contexts.get(tg_bot_id)
+
+
+def find_bot_context(bot_pk: int):
+    for ctx in bot_contexts.values():
+        if ctx.bot.pk == bot_pk:
+            return ctx
+    return None
@@ -0,0 +1,85 @@
+import json
+import asyncio
+import logging
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Канал, через який адмінка керує ботами в процесі runbots
+CONTROL_CHANNEL = "bots:control"
+
+_redis_client = None
+_async_redis_client = None
+
+
+def get_redis():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_DSN)
+    return _redis_client
+
+
+def get_async_redis():
+    global _async_redis_client
+    if _async_redis_client is None:
+        _async_redis_client = aioredis.from_url(settings.REDIS_DSN)
+    return _async_redis_client
+
+
+def publish_control(action: str, **payload):
+    """
+    Надсилає команду в процес runbots (reload, stop, ...)
+    """
+    message = json.dumps({"action": action, **payload})
+    try:
+        get_redis().publish(CONTROL_CHANNEL, message)
+    except redis.RedisError as e:
+        logger.error(f"Не вдалося надіслати команду {action} ботам: {e}")
+
+
+async def listen_control(on_message, on_idle=None, idle_interval: float = 60):
+    """
+    Слухає канал команд. `on_idle` викликається раз на `idle_interval` секунд,
+    щоб звірити стан навіть якщо повідомлення було втрачено
+    """
+    loop = asyncio.get_running_loop()
+    last_idle = loop.time()
+
+    async def maybe_idle():
+        nonlocal last_idle
+        if on_idle and loop.time() - last_idle >= idle_interval:
+            last_idle = loop.time()
+            try:
+                await on_idle()
+            except Exception as e:
+                logger.error(f"Помилка звірки ботів: {e}", exc_info=True)
+
+    while True:
+        client = aioredis.from_url(settings.REDIS_DSN)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(CONTROL_CHANNEL)
+            logger.info(f"Підписано на канал {CONTROL_CHANNEL}")
+
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message:
+                    try:
+                        await on_message(json.loads(message["data"]))
+                    except Exception as e:
+                        logger.error(f"Помилка обробки команди {message['data']}: {e}", exc_info=True)
+
+                await maybe_idle()
+
+        except aioredis.RedisError as e:
+            logger.error(f"Втрачено з'єднання з каналом команд: {e}")
+            await asyncio.sleep(5)
+            await maybe_idle()
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
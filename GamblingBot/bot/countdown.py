@@ -0,0 +1,113 @@
+import logging
+import mimetypes
+from dataclasses import dataclass
+
+from aiogram.types import FSInputFile
+from aiogram.exceptions import TelegramAPIError
+
+from .user_cache import CachedUser
+from .timer import timer
+from .context import find_bot_context
+from .config_cache import get_bot_config
+from .sender import send_message_safe, get_keyboard
+
+logger = logging.getLogger(__name__)
+
+DIGITS = ["🕔 5", "🕔 4", "🕔 3", "🕔 2", "🕔 1"]
+MESSAGE_DELAY = 2
+DIGIT_DELAY = 1
+
+
+@dataclass(slots=True)
+class Countdown:
+    """
+    Стан одного відліку: які редагування залишились і куди їх надсилати
+    """
+    bot_pk: int
+    chat_id: int
+    message_id: int
+    user: CachedUser
+    steps: tuple
+    position: int = 0
+
+
+def build_steps(config):
+    """
+    (затримка, текст) для кожного редагування повідомлення з відліком
+    """
+    return tuple(
+        (MESSAGE_DELAY, message.text) for message in config.digit_messages[1:]
+    ) + tuple((DIGIT_DELAY, digit) for digit in DIGITS)
+
+
+def start_countdown(bot_pk, user, message, config):
+    countdown = Countdown(
+        bot_pk=bot_pk,
+        chat_id=message.chat.id,
+        message_id=message.message_id,
+        user=user,
+        steps=build_steps(config),
+    )
+    timer.call_later(countdown.steps[0][0], run_step, countdown)
+
+
+async def run_step(countdown: Countdown):
+    bot_ctx = find_bot_context(countdown.bot_pk)
+    if not bot_ctx:
+        return
+
+    _, text = countdown.steps[countdown.position]
+    await bot_ctx.limiter.acquire()
+    try:
+        await bot_ctx.tg_bot.edit_message_text(
+            text=text, chat_id=countdown.chat_id, message_id=countdown.message_id
+        )
+    except TelegramAPIError as e:
+        logger.warning(f"Відлік для {countdown.chat_id} зупинено: {e}")
+        return
+
+    countdown.position += 1
+    if countdown.position < len(countdown.steps):
+        timer.call_later(countdown.steps[countdown.position][0], run_step, countdown)
+    else:
+        timer.call_later(0, finish_countdown, countdown)
+
+
+async def finish_countdown(countdown: Countdown):
+    """
+    Видаляє повідомлення з відліком і надсилає основне повідомлення з посиланням
+    """
+    bot_ctx = find_bot_context(countdown.bot_pk)
+    if not bot_ctx:
+        return
+
+    await bot_ctx.limiter.acquire()
+    try:
+        await bot_ctx.tg_bot.delete_message(
+            chat_id=countdown.chat_id, message_id=countdown.message_id
+        )
+    except TelegramAPIError as e:
+        logger.warning(f"Не вдалося видалити відлік для {countdown.chat_id}: {e}")
+
+    config = await get_bot_config(countdown.bot_pk)
+    main_message = config.main_message
+    if not main_message:
+        logger.warning(f"Основне повідомлення для бота {countdown.bot_pk} не знайдено")
+        return
+
+    bloger = config.blogers.get(countdown.user.bloger_id)
+    keyboard = get_keyboard(
+        main_message.button_text,
+        bloger.ref_link_to_site if bloger else None,
+    )
+    media_file = FSInputFile(main_message.media.path) if main_message.media else None
+    mime, _ = (
+        mimetypes.guess_type(main_message.media.path)
+        if main_message.media
+        else (None, None)
+    )
+
+    await bot_ctx.limiter.acquire()
+    await send_message_safe(
+        bot_ctx.tg_bot, countdown.user, main_message.text, keyboard, media_file, mime
+    )
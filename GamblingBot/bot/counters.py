@@ -0,0 +1,89 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import User, UserStatusCounter
+from .db import db_write
+
+logger = logging.getLogger(__name__)
+
+
+def bump_status_counter(bot_pk, status, delta, create=True):
+    """
+    Атомарно змінює лічильник (bot, status) на `delta`.
+    `create=False` - не створювати відсутній лічильник (при видаленні бота
+    лічильники видаляються каскадом разом з користувачами)
+    """
+    updated = UserStatusCounter.objects.filter(bot_id=bot_pk, status=status).update(
+        count=F("count") + delta
+    )
+    if updated or not create:
+        return
+
+    with transaction.atomic():
+        UserStatusCounter.objects.get_or_create(bot_id=bot_pk, status=status)
+        UserStatusCounter.objects.filter(bot_id=bot_pk, status=status).update(
+            count=F("count") + delta
+        )
+
+
+def move_status_counter(bot_pk, old_status, new_status):
+    bump_status_counter(bot_pk, old_status, -1)
+    bump_status_counter(bot_pk, new_status, 1)
+
+
+def reconcile_status_counters(bot_pks=None):
+    """
+    Перераховує лічильники з таблиці користувачів (для всіх ботів або `bot_pks`)
+    """
+    with transaction.atomic():
+        counters = UserStatusCounter.objects.all()
+        users = User.objects.all()
+        if bot_pks is not None:
+            counters = counters.filter(bot_id__in=bot_pks)
+            users = users.filter(bot_id__in=bot_pks)
+
+        # блокування лічильників: зміни статусів, що йдуть паралельно,
+        # дочекаються перерахунку і застосуються поверх нього
+        existing = {
+            (c.bot_id, c.status): c for c in counters.select_for_update()
+        }
+        actual = {
+            (row["bot_id"], row["status"]): row["count"]
+            for row in users.values("bot_id", "status").annotate(count=Count("id"))
+        }
+
+        changed, created = [], []
+        for key, counter in existing.items():
+            count = actual.pop(key, 0)
+            if counter.count != count:
+                logger.warning(
+                    f"Лічильник {key} розійшовся: {counter.count} замість {count}"
+                )
+                counter.count = count
+                changed.append(counter)
+        for (bot_pk, status), count in actual.items():
+            created.append(UserStatusCounter(bot_id=bot_pk, status=status, count=count))
+
+        UserStatusCounter.objects.bulk_update(changed, ["count"], batch_size=500)
+        UserStatusCounter.objects.bulk_create(created, batch_size=500)
+
+    return len(changed) + len(created)
+
+
+async def reconcile_counters_job():
+    fixed = await db_write(reconcile_status_counters)()
+    logger.info(f"Звірку лічильників завершено, виправлено {fixed}")
+
+
+def get_status_stats(bot_pks=None) -> dict:
+    """
+    Кількість користувачів за статусами для всіх ботів або `bot_pks`
+    """
+    counters = UserStatusCounter.objects.all()
+    if bot_pks is not None:
+        counters = counters.filter(bot_id__in=bot_pks)
+
+    stats = counters.values("status").annotate(total=Sum("count"))
+    return {row["status"]: row["total"] for row in stats if row["total"]}
@@ -0,0 +1,173 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+
+from .metrics import METRICS_ENABLED, add_db_time, record_query
+
+logger = logging.getLogger(__name__)
+
+# Скільки запитів до бази може виконуватись одночасно в процесі runbots
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+# Скільки записів черги об'єднується в одну транзакцію
+DB_WRITE_BATCH_SIZE = int(os.getenv('DB_WRITE_BATCH_SIZE', 100))
+
+db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+
+def _run_with_connection(func, args, kwargs):
+    # з'єднання потоку живе між викликами (SQLite: CONN_MAX_AGE=None,
+    # Postgres: повертається в пул). Після виклику, як у кінці запиту Django,
+    # закривається лише зламане з'єднання або старше за CONN_MAX_AGE
+    try:
+        if not METRICS_ENABLED:
+            return func(*args, **kwargs)
+        with connection.execute_wrapper(record_query):
+            return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def db_async(func):
+    """
+    Аналог sync_to_async, але виконує ORM код у пулі з DB_POOL_SIZE потоків,
+    кожен зі своїм з'єднанням, а не в одному спільному потоці
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(
+                db_executor,
+                context.run,
+                functools.partial(_run_with_connection, func, args, kwargs),
+            )
+        finally:
+            add_db_time(time.perf_counter() - start)
+
+    return wrapper
+
+
+def _write_batch(batch):
+    """
+    Виконує пакет записів в одній транзакції, кожен у своєму savepoint:
+    помилка одного запису відкочує лише його
+    """
+    results = []
+    with transaction.atomic():
+        for func, args, kwargs, context in batch:
+            try:
+                with transaction.atomic():
+                    results.append((True, context.run(func, *args, **kwargs)))
+            except Exception as e:
+                results.append((False, e))
+    return results
+
+
+class WriteQueue:
+    """
+    Єдиний записувач: записи з усіх хендлерів стають у чергу, фонова задача
+    забирає все, що накопичилось (до `batch_size`), і комітить однією транзакцією
+    """
+
+    def __init__(self, batch_size: int = DB_WRITE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._loop = None
+
+    async def submit(self, func, args, kwargs):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            # порожній контекст: інакше задача успадкує current_update апдейту,
+            # який її створив, і триматиме його до кінця процесу
+            self._task = loop.create_task(self._run(), context=contextvars.Context())
+
+        future = loop.create_future()
+        self._queue.put_nowait(
+            (func, args, kwargs, contextvars.copy_context(), future)
+        )
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                results = await loop.run_in_executor(
+                    db_executor,
+                    functools.partial(
+                        _run_with_connection,
+                        _write_batch,
+                        ([item[:4] for item in batch],),
+                        {},
+                    ),
+                )
+            except Exception as e:
+                logger.error(f"Не вдалося записати пакет з {len(batch)} змін: {e}")
+                results = [(False, e)] * len(batch)
+
+            for (*_, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+
+write_queue = WriteQueue()
+
+
+def db_write(func):
+    """
+    Як db_async, але для коду, що пише в базу. При DB_WRITE_QUEUE запис
+    виконується через спільну чергу write_queue
+    """
+    if not settings.DB_WRITE_QUEUE:
+        return db_async(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await write_queue.submit(func, args, kwargs)
+        finally:
+            add_db_time(time.perf_counter() - start)
+
+    return wrapper
+
+
+def shutdown_db_pool():
+    """
+    Закриває з'єднання в кожному потоці пулу та зупиняє пул
+    """
+    barrier = threading.Barrier(DB_POOL_SIZE)
+
+    def close_connections():
+        # бар'єр гарантує, що кожен потік пулу виконає рівно одне закриття
+        barrier.wait(timeout=10)
+        connections.close_all()
+
+    futures = [db_executor.submit(close_connections) for _ in range(DB_POOL_SIZE)]
+    for future in futures:
+        try:
+            future.result()
+        except threading.BrokenBarrierError:
+            pass
+    db_executor.shutdown(wait=True)
@@ -0,0 +1,107 @@
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Скільки рядків за раз читається з курсора бази
+EXPORT_CHUNK_SIZE = 2000
+
+USER_FIELDS = (
+    "telegram_id",
+    "username",
+    "first_name",
+    "last_name",
+    "bot_id",
+    "bloger_id",
+    "bloger__name",
+    "status",
+    "joined_at",
+)
+
+BROADCAST_FIELDS = (
+    "id",
+    "bot_id",
+    "folder_id",
+    "send_at",
+    "sent",
+    "delivered",
+    "failed",
+    "text",
+)
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class Echo:
+    """
+    Файлоподібний об'єкт для csv.writer: повертає рядок замість запису
+    """
+
+    def write(self, value):
+        return value
+
+
+def user_rows(queryset):
+    return (
+        queryset.order_by("pk")
+        .values_list(*USER_FIELDS)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def broadcast_rows(queryset):
+    return (
+        queryset.order_by("pk")
+        .values_list(*BROADCAST_FIELDS)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def _value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def render_rows(fields, rows, fmt):
+    """
+    Генератор рядків файлу експорту, по одному на запис
+    """
+    if fmt == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([_value(value) for value in row])
+    elif fmt == "ndjson":
+        for row in rows:
+            record = {field: _value(value) for field, value in zip(fields, row)}
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+    else:
+        raise ValueError(f"Невідомий формат {fmt}")
+
+
+def streaming_export(name, fields, rows, fmt):
+    """
+    Віддає експорт частинами - завантаження починається одразу,
+    а пам'ять не залежить від кількості рядків
+    """
+    response = StreamingHttpResponse(
+        render_rows(fields, rows, fmt), content_type=FORMATS[fmt]
+    )
+    filename = f"{name}-{timezone.localtime():%Y%m%d-%H%M}.{fmt}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def export_users(queryset, fmt):
+    return streaming_export("users", USER_FIELDS, user_rows(queryset), fmt)
+
+
+def export_broadcasts(queryset, fmt):
+    return streaming_export(
+        "broadcasts", BROADCAST_FIELDS, broadcast_rows(queryset), fmt
+    )
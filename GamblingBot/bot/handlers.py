@@ -1,131 +1,91 @@
-import asyncio
 import logging
 import mimetypes
-from asgiref.sync import sync_to_async
 
-from django.utils import timezone
-from aiogram import Router, F, Bot as TgBot
+from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, FSInputFile
 from aiogram.filters.command import CommandStart
 
-from .models import User, Bloger, Campain, MessageAfterStart, Bot, Message as DbMessage
+from .context import BotContext
+from .db import db_write
+from .config_cache import get_bot_config, get_term_message
+from .services import get_ref_bloger, register_user
+from .user_cache import user_cache, get_user
 from .utils import send_message
-from .sender import send_message_safe, get_keyboard
-
-DIGITS = ["🕔 5", "🕔 4", "🕔 3", "🕔 2", "🕔 1"]
-
-
-async def save_user(ref_code, message: Message):
-    if ref_code.startswith("ref_"):
-        bloger_id = ref_code.split("_")[1]
-        bloger = await sync_to_async(Bloger.objects.get)(id=bloger_id)
-        bot = await sync_to_async(lambda: bloger.bot)()
-
-        user, created = await sync_to_async(User.objects.get_or_create)(
-            telegram_id=message.from_user.id,
-            bot=bot,
-            defaults={
-                "username": message.from_user.username,
-                "first_name": message.from_user.first_name,
-                "last_name": message.from_user.last_name,
-                "bloger": bloger,
-            },
-        )
+from .sender import send_message_safe
+from .countdown import start_countdown
+from .rollups import record_event
+from .singleflight import SingleFlight
 
-        return created, user, bloger, bot
 
+# Повторні /start від того самого користувача (подвійне натискання,
+# повторна доставка від Telegram) обробляються один раз
+start_flight = SingleFlight()
 
-async def send_first_massage(args, message: Message):
-    if len(args) > 1:
-        ref_code = args[1]
 
-        created, user, bloger, bot = await save_user(ref_code, message)
+async def process_start(message: Message, bot_ctx: BotContext):
+    args = message.text.split()
+    term_msg = await get_term_message()
+    config = await get_bot_config(bot_ctx.bot.pk)
 
+    bloger = get_ref_bloger(args[1] if len(args) > 1 else None, config)
+    if bloger:
+        user, created = await db_write(register_user)(
+            config.bot, bloger, message.from_user, config.campains
+        )
+        user_cache.put(user)
         if created:
-            bloger.invited_people += 1
-            await sync_to_async(bloger.save)()
-
-            if bot.use_our_messages:
-                campains = await sync_to_async(
-                    lambda: list(Campain.objects.filter(bot=bot))
-                )()
-            else:
-                campains = await sync_to_async(
-                    lambda: list(Campain.objects.filter(folder=bot.folder))
-                )()
-            for campain in campains:
-                send_time = timezone.now() + timezone.timedelta(
-                    minutes=campain.delay_minutes
-                )
-                print(f"time to sent message: {send_time}")
-                await sync_to_async(MessageAfterStart.objects.create)(
-                    bot=bot,
-                    user=user,
-                    text=campain.text,
-                    button_text=campain.button_text,
-                    media=campain.media,
-                    send_at=send_time,
-                )
-
-        await send_message(message, bloger)
+            record_event(config.bot.pk, bloger.pk, "joins")
+    elif len(args) > 1:
+        logging.warning(f"Невідомий реферальний код {args[1]} для бота {config.bot.pk}")
+
+    if term_msg:
+        await send_message(message, bloger=None, msg_db=term_msg)
+    elif bloger:
+        if await send_message(message, bloger, config.first_message):
+            record_event(config.bot.pk, bloger.pk, "first_messages")
 
 
 def create_router():
     router = Router()
 
     @router.message(CommandStart())
-    async def start(message: Message):
-        args = message.text.split()
+    async def start(message: Message, bot_ctx: BotContext):
         logging.info("Отримано повідомлення")
-        term_msg = await sync_to_async(DbMessage.objects.filter(term=True).first)()
-
-        if term_msg:
-            ref_code = args[1]
-            created, user, bloger, bot = await save_user(ref_code, message)
-            await send_message(message, bloger=None, msg_db=term_msg)
-        else:
-            await send_first_massage(args, message)
+        _, duplicate = await start_flight.do(
+            (bot_ctx.bot.pk, message.from_user.id), process_start, message, bot_ctx
+        )
+        if duplicate:
+            logging.info(f"Повторний /start від {message.from_user.id} пропущено")
 
     @router.callback_query(F.data == "accept_terms")
-    async def accept_terms(query: CallbackQuery):
-        user = await sync_to_async(
-            User.objects.filter(
-                telegram_id=query.message.chat.id, bot__token=query.bot.token
-            ).first
-        )()
+    async def accept_terms(query: CallbackQuery, bot_ctx: BotContext):
+        user = await get_user(bot_ctx.bot.pk, query.message.chat.id)
 
         if not user:
             logging.warning(f"User not found for chat_id: {query.message.chat.id}")
             return
-            
-        bloger = await sync_to_async(lambda: user.bloger)()
+
+        config = await get_bot_config(bot_ctx.bot.pk)
+        bloger = config.blogers.get(user.bloger_id)
 
         await query.message.delete()
-        
-        await send_message(query.message, bloger=bloger)
+
+        if await send_message(query.message, bloger, config.first_message):
+            record_event(bot_ctx.bot.pk, user.bloger_id, "first_messages")
 
     @router.callback_query(F.data == "send_digits")
-    async def send_digits(query: CallbackQuery):
+    async def send_digits(query: CallbackQuery, bot_ctx: BotContext):
         user_id = query.message.chat.id
-        bot_id = query.message.bot.id
-
-        bot = await sync_to_async(Bot.objects.get)(bot_id=bot_id)
-        user = await sync_to_async(
-            User.objects.filter(bot=bot, telegram_id=user_id).first
-        )()
-
-        if bot.use_our_messages:
-            messages = await sync_to_async(list)(
-                DbMessage.objects.filter(bot=bot, message_for_digits=True)
-            )
-        else:
-            folder = await sync_to_async(lambda: bot.folder)()
-            messages = await sync_to_async(list)(
-                DbMessage.objects.filter(folder=folder, message_for_digits=True)
-            )
+
+        bot = bot_ctx.bot
+        user = await get_user(bot.pk, user_id)
+        config = await get_bot_config(bot.pk)
+        if not user or not config.digit_messages:
+            logging.warning(f"Немає користувача або повідомлень для відліку: {user_id}")
+            return
 
         await query.message.delete()
-        first_message = messages[0]
+        first_message = config.digit_messages[0]
         keyboard = None
         media_file = (
             FSInputFile(first_message.media.path) if first_message.media else None
@@ -136,47 +96,12 @@ def create_router():
             else (None, None)
         )
 
-        async with TgBot(bot.token) as tg_bot:
-            msg = await send_message_safe(
-                tg_bot, user, first_message.text, keyboard, media_file, mime
-            )
-            for message in messages[1:]:
-                await asyncio.sleep(2)
-                msg = await msg.edit_text(message.text)
-
-            for digit in DIGITS:
-                await asyncio.sleep(1)
-                msg = await msg.edit_text(digit)
-
-            await msg.delete()
-            if bot.use_our_messages:
-                main_message = await sync_to_async(
-                    DbMessage.objects.filter(
-                        bot=bot, message_for_digits=False, send_digits=False
-                    ).first
-                )()
-            else:
-                main_message = await sync_to_async(
-                    DbMessage.objects.filter(
-                        folder=await sync_to_async(lambda: bot.folder)(),
-                        message_for_digits=False,
-                        send_digits=False,
-                    ).first
-                )()
-            keyboard = get_keyboard(
-                main_message.button_text,
-                await sync_to_async(lambda: user.bloger.ref_link_to_site)(),
-            )
-            media_file = (
-                FSInputFile(main_message.media.path) if main_message.media else None
-            )
-            mime, _ = (
-                mimetypes.guess_type(main_message.media.path)
-                if main_message.media
-                else (None, None)
-            )
-            msg = await send_message_safe(
-                tg_bot, user, main_message.text, keyboard, media_file, mime
-            )
+        await bot_ctx.limiter.acquire()
+        msg = await send_message_safe(
+            bot_ctx.tg_bot, user, first_message.text, keyboard, media_file, mime
+        )
+        if msg:
+            # решта відліку виконується таймером, хендлер не чекає
+            start_countdown(bot.pk, user, msg, config)
 
     return router
@@ -0,0 +1,200 @@
+import os
+import csv
+import json
+import logging
+import threading
+from itertools import islice
+
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Bot, Bloger, User, UserStatus
+from .counters import reconcile_status_counters
+
+logger = logging.getLogger(__name__)
+
+# Скільки користувачів вставляється одним bulk_create
+IMPORT_BATCH_SIZE = 5000
+
+IMPORT_FIELDS = ("username", "first_name", "last_name", "status")
+
+
+def read_records(file, fmt):
+    """
+    Записи користувачів з CSV або NDJSON (формат export_data users)
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(file)
+    elif fmt == "ndjson":
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Невідомий формат {fmt}")
+
+
+def copy_blogers(source: Bot, target: Bot) -> dict:
+    """
+    Створює в `target` блогерів `source`, яких там ще немає (за іменем).
+    Повертає {pk блогера source: pk блогера target}
+    """
+    existing = {bloger.name: bloger for bloger in Bloger.objects.filter(bot=target)}
+    mapping = {}
+    for bloger in Bloger.objects.filter(bot=source):
+        copy = existing.get(bloger.name)
+        if copy is None:
+            # ref_link_to_bot для нового бота згенерує сигнал generate_ref_link
+            copy = Bloger.objects.create(
+                bot=target,
+                name=bloger.name,
+                ref_link_to_site=bloger.ref_link_to_site,
+                invited_people=bloger.invited_people,
+            )
+            existing[copy.name] = copy
+        mapping[bloger.pk] = copy.pk
+    return mapping
+
+
+def _insert(target: Bot, users: list) -> int:
+    """
+    Вставляє пачку, пропускаючи тих, хто вже є в `target` (і повтори в самій пачці).
+    Повертає кількість справді створених
+    """
+    batch = {}
+    for user in users:
+        batch.setdefault(user.telegram_id, user)
+
+    with transaction.atomic():
+        existing = set(
+            User.objects.filter(bot=target, telegram_id__in=batch)
+            .values_list("telegram_id", flat=True)
+        )
+        new = {
+            telegram_id: user for telegram_id, user in batch.items() if telegram_id not in existing
+        }
+        # ignore_conflicts - на випадок /start, який встиг створити користувача
+        User.objects.bulk_create(new.values(), batch_size=IMPORT_BATCH_SIZE, ignore_conflicts=True)
+        # такі користувачі мовчки пропускаються, але після вставки теж існують -
+        # відрізняються від вставлених нами датою приєднання
+        inserted = User.objects.filter(bot=target, telegram_id__in=new).values_list(
+            "telegram_id", "joined_at"
+        )
+        return sum(
+            1 for telegram_id, joined_at in inserted if joined_at == new[telegram_id].joined_at
+        )
+
+
+def _parse_joined_at(value):
+    joined_at = parse_datetime(value) if value else None
+    if joined_at is None:
+        return timezone.now()
+    if timezone.is_naive(joined_at):
+        joined_at = timezone.make_aware(joined_at)
+    return joined_at
+
+
+def import_users(target: Bot, records, total=None, progress=None) -> tuple[int, int, int]:
+    """
+    Імпортує користувачів у `target` пачками по IMPORT_BATCH_SIZE.
+    Блогер шукається серед блогерів `target` за `bloger__name`.
+    Записи без коректного telegram_id пропускаються.
+    Повертає (оброблено, створено, пропущено)
+    """
+    blogers = dict(Bloger.objects.filter(bot=target).values_list("name", "pk"))
+    statuses = set(UserStatus.values)
+
+    def build(record):
+        try:
+            telegram_id = int(record.get("telegram_id"))
+        except (TypeError, ValueError):
+            return None
+
+        user = User(
+            bot=target,
+            telegram_id=telegram_id,
+            bloger_id=blogers.get(record.get("bloger__name")),
+            joined_at=_parse_joined_at(record.get("joined_at")),
+            # імпортовані користувачі не отримують повідомлень після старту
+            drip_cursor=None,
+        )
+        for field in IMPORT_FIELDS:
+            if record.get(field):
+                setattr(user, field, record[field])
+        if user.status not in statuses:
+            user.status = UserStatus.ACTIVE
+        return user
+
+    return _run_batches(target, map(build, records), total, progress)
+
+
+def copy_users(source: Bot, target: Bot, progress=None) -> tuple[int, int, int]:
+    """
+    Копіює аудиторію та блогерів `source` в `target` разом з датою приєднання.
+    Прогрес повідомлень після старту не копіюється: затримки кроків `source`
+    не стосуються кампаній `target`. Повертає (оброблено, створено, пропущено)
+    """
+    bloger_map = copy_blogers(source, target)
+    rows = (
+        User.objects.filter(bot=source)
+        .order_by("pk")
+        .values("telegram_id", "bloger_id", "joined_at", *IMPORT_FIELDS)
+        .iterator(chunk_size=IMPORT_BATCH_SIZE)
+    )
+    users = (
+        User(
+            **{**row, "bloger_id": bloger_map.get(row["bloger_id"])},
+            bot=target,
+            drip_cursor=None,
+        )
+        for row in rows
+    )
+    total = User.objects.filter(bot=source).count()
+    return _run_batches(target, users, total, progress)
+
+
+def _run_batches(target: Bot, users, total=None, progress=None) -> tuple[int, int, int]:
+    # None - запис, з якого не вдалося зібрати користувача
+    done = created = skipped = 0
+    while batch := list(islice(users, IMPORT_BATCH_SIZE)):
+        valid = [user for user in batch if user is not None]
+        skipped += len(batch) - len(valid)
+        created += _insert(target, valid)
+        done += len(batch)
+        if progress:
+            progress(done, created, skipped, total)
+
+    # bulk_create не викликає сигналів - лічильники статусів перераховуються
+    reconcile_status_counters([target.pk])
+    logger.info(
+        f"Імпорт у бот {target.pk}: оброблено {done}, створено {created}, пропущено {skipped}"
+    )
+    return done, created, skipped
+
+
+def run_in_background(func, *args, cleanup_path=None):
+    """
+    Запускає імпорт в окремому потоці, щоб не тримати запит адмінки
+    """
+
+    def run():
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"Помилка імпорту користувачів: {e}", exc_info=True)
+        finally:
+            connections.close_all()
+            if cleanup_path:
+                os.unlink(cleanup_path)
+
+    threading.Thread(target=run, name="import-users", daemon=True).start()
+
+
+def import_file(target: Bot, path, fmt):
+    with open(path, encoding="utf-8", newline="") as file:
+        return import_users(target, read_records(file, fmt), progress=log_progress)
+
+
+def log_progress(done, created, skipped, total):
+    of_total = f"/{total}" if total else ""
+    logger.info(f"Імпорт: оброблено {done}{of_total}, створено {created}, пропущено {skipped}")
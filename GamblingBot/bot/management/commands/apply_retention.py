@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bot.retention import POLICIES, RETENTION_BATCH_SIZE, apply_policy
+
+
+class Command(BaseCommand):
+    help = "Архівує в gzip NDJSON та видаляє старі рядки за політиками зберігання"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--policy", action="append", choices=sorted(POLICIES), help="Лише ця політика (можна кілька)"
+        )
+        parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Лише порахувати рядки")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] <= 0:
+            raise CommandError("--batch-size має бути більше 0")
+
+        for name in options["policy"] or POLICIES:
+            policy = POLICIES[name]
+            total = apply_policy(policy, options["batch_size"], options["dry_run"])
+            verb = "До архівації" if options["dry_run"] else "Заархівовано"
+            self.stdout.write(
+                f"{policy.name} (старше {policy.keep_days} дн.): {verb} {total} рядків"
+            )
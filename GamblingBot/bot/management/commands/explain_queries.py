@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from bot.models import Bot, User, ScheduledMessage, MessageAfterStart
+
+# Ознаки повного перебору таблиці в плані SQLite / PostgreSQL
+FULL_SCAN_MARKERS = ("Seq Scan",)
+
+
+def is_full_scan(plan: str) -> bool:
+    if connection.vendor == "sqlite":
+        # "SCAN bot_user" - перебір таблиці, "SCAN ... USING INDEX" - по індексу
+        return any(
+            " SCAN " in f" {line} " and "INDEX" not in line
+            for line in plan.splitlines()
+        )
+    return any(marker in plan for marker in FULL_SCAN_MARKERS)
+
+
+def hot_queries(bot_pk):
+    now = timezone.now()
+    return {
+        "Користувач за telegram_id": User.objects.filter(
+            bot_id=bot_pk, telegram_id=0
+        ).order_by("pk")[:1],
+        "Пошук за юзернеймом в адмінці": User.objects.filter(
+            bot_id=bot_pk, username="username"
+        ).order_by("-pk")[:100],
+        "Пошук за telegram_id в адмінці без бота": User.objects.filter(
+            telegram_id=0
+        ).order_by("-pk")[:100],
+        "Пошук за юзернеймом в адмінці без бота": User.objects.filter(
+            username="username"
+        ).order_by("-pk")[:100],
+        "Користувачі для lazy розсилки": User.objects.filter(
+            bot_id=bot_pk,
+            drip_cursor__isnull=False,
+            drip_cursor__lt=0,
+            joined_at__lte=now,
+        ).order_by("joined_at", "pk")[:500],
+        "Статистика за статусами": User.objects.filter(bot_id=bot_pk)
+        .values("status")
+        .annotate(count=Count("id")),
+        "Користувачі для розсилки": User.objects.select_related("bloger").filter(
+            bot_id=bot_pk
+        ),
+        "Заплановані повідомлення": ScheduledMessage.objects.filter(
+            send_at__lte=now, sent=False
+        ).order_by("send_at", "pk"),
+        "Повідомлення після старту": MessageAfterStart.objects.filter(
+            send_at__lte=now, sent=False
+        ).order_by("send_at", "pk")[:500],
+    }
+
+
+class Command(BaseCommand):
+    help = "Показує плани запитів гарячих шляхів і перевіряє, що вони йдуть по індексах"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bot", type=int, help="ID бота для запитів")
+
+    def handle(self, *args, **options):
+        bot_pk = options["bot"] or Bot.objects.values_list("pk", flat=True).first() or 0
+
+        full_scans = []
+        for name, queryset in hot_queries(bot_pk).items():
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+
+            if is_full_scan(plan):
+                full_scans.append(name)
+                self.stdout.write(self.style.WARNING("Повний перебір таблиці"))
+            else:
+                self.stdout.write(self.style.SUCCESS("OK"))
+            self.stdout.write("")
+
+        if full_scans:
+            # PostgreSQL на майже порожніх таблицях може обрати Seq Scan навіть
+            # за наявності індексу - перевіряйте на реальних даних
+            raise CommandError(f"Запити без індексу: {', '.join(full_scans)}")
+        self.stdout.write(self.style.SUCCESS("Усі гарячі запити використовують індекси"))
@@ -0,0 +1,51 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from bot.models import User, ScheduledMessage
+from bot.exports import (
+    FORMATS,
+    USER_FIELDS,
+    BROADCAST_FIELDS,
+    user_rows,
+    broadcast_rows,
+    render_rows,
+)
+
+
+class Command(BaseCommand):
+    help = "Потоково експортує користувачів або результати розсилок у CSV/NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("what", choices=("users", "broadcasts"))
+        parser.add_argument("--bot", type=int, help="ID бота")
+        parser.add_argument("--folder", type=int, help="ID папки")
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--output", default="-", help="Файл (за замовчуванням stdout)")
+
+    def handle(self, *args, **options):
+        if options["what"] == "users":
+            queryset = User.objects.all()
+            if options["folder"]:
+                queryset = queryset.filter(bot__folder_id=options["folder"])
+            fields, rows_func = USER_FIELDS, user_rows
+        else:
+            queryset = ScheduledMessage.objects.all()
+            if options["folder"]:
+                queryset = queryset.filter(folder_id=options["folder"])
+            fields, rows_func = BROADCAST_FIELDS, broadcast_rows
+
+        if options["bot"]:
+            queryset = queryset.filter(bot_id=options["bot"])
+
+        lines = render_rows(fields, rows_func(queryset), options["format"])
+        if options["output"] == "-":
+            sys.stdout.writelines(lines)
+            return
+
+        count = -1 if options["format"] == "csv" else 0
+        with open(options["output"], "w", encoding="utf-8", newline="") as output:
+            for line in lines:
+                output.write(line)
+                count += 1
+        self.stderr.write(self.style.SUCCESS(f"Експортовано {count} рядків у {options['output']}"))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bot.models import Bot
+from bot.imports import read_records, import_users, copy_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Імпортує користувачів у бота з CSV/NDJSON або копіює їх з іншого бота. "
+        "Бот-джерело не змінюється: щоб перенести аудиторію, видаліть його після копіювання"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("target", type=int, help="ID бота, в який імпортувати")
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument("--from-bot", type=int, help="ID бота, з якого скопіювати аудиторію та блогерів")
+        source.add_argument("--file", help="Файл з export_data users")
+        parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+
+    def progress(self, done, created, skipped, total):
+        of_total = f"/{total}" if total else ""
+        self.stdout.write(f"Оброблено {done}{of_total}, створено {created}, пропущено {skipped}")
+
+    def handle(self, *args, **options):
+        target = Bot.objects.filter(pk=options["target"]).first()
+        if target is None:
+            raise CommandError(f"Бот {options['target']} не знайдений")
+
+        if options["from_bot"]:
+            source = Bot.objects.filter(pk=options["from_bot"]).first()
+            if source is None or source.pk == target.pk:
+                raise CommandError("Невірний бот-джерело")
+            done, created, skipped = copy_users(source, target, self.progress)
+        else:
+            with open(options["file"], encoding="utf-8", newline="") as file:
+                records = read_records(file, options["format"])
+                done, created, skipped = import_users(target, records, progress=self.progress)
+
+        self.stdout.write(self.style.SUCCESS(f"Готово: оброблено {done}, створено {created}, пропущено {skipped}"))
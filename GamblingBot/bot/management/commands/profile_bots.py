@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from bot.control import publish_control
+from bot.profiler import PROFILE_DIR, PROFILE_DURATION, PROFILE_INTERVAL, TRACEMALLOC_FRAMES
+
+
+class Command(BaseCommand):
+    help = "Профілювання запущеного runbots через канал керування (результати в PROFILE_DIR)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "mode",
+            choices=("cpu", "tasks", "memory-start", "memory-snapshot", "memory-stop"),
+            help="cpu - семплінговий профіль, tasks - стеки asyncio задач, "
+                 "memory-* - tracemalloc (кожен знімок порівнюється з попереднім)",
+        )
+        parser.add_argument("--duration", type=int, default=PROFILE_DURATION, help="Тривалість профілю, сек")
+        parser.add_argument("--interval", type=float, default=PROFILE_INTERVAL, help="Інтервал вибірок, сек")
+        parser.add_argument("--frames", type=int, default=TRACEMALLOC_FRAMES, help="Глибина стеків tracemalloc")
+
+    def handle(self, *args, **options):
+        mode = options["mode"]
+        if mode == "cpu":
+            publish_control("profile", duration=options["duration"], interval=options["interval"])
+        elif mode == "tasks":
+            publish_control("dump_tasks")
+        elif mode == "memory-start":
+            publish_control("memory_start", frames=options["frames"])
+        else:
+            publish_control(mode.replace("-", "_"))
+
+        self.stdout.write(self.style.SUCCESS(f"Команду надіслано, результати з'являться в {PROFILE_DIR}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from bot.counters import reconcile_status_counters
+
+
+class Command(BaseCommand):
+    help = "Перераховує лічильники користувачів за статусами"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bot", type=int, action="append", help="ID бота (можна кілька)")
+
+    def handle(self, *args, **options):
+        fixed = reconcile_status_counters(options["bot"])
+        self.stdout.write(self.style.SUCCESS(f"Виправлено лічильників: {fixed}"))
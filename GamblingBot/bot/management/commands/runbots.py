@@ -1,10 +1,19 @@
+import os
 import asyncio
 import logging
 import pytz
+from datetime import timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from django.core.management.base import BaseCommand
+from django.utils import timezone
 from bot.bot_instance import scheduler, start_all_bots
-from bot.sender import send_scheduled_messages, send_messages_after_start
+from bot.db import shutdown_db_pool
+from bot.counters import reconcile_counters_job
+from bot.rollups import flush_events, flush_events_job
+from bot.retention import apply_retention_job
+from bot.metrics import METRICS_ENABLED, log_metrics_job
+from bot.profiler import install_signal_handlers
+from bot.sender import send_scheduled_messages, send_messages_after_start, send_drip_messages
 
 logging.basicConfig(
     level=logging.INFO,
@@ -61,13 +70,80 @@ class Command(BaseCommand):
                 coalesce=True,
                 max_instances=1,
                 misfire_grace_time=60,
-                # можна відсунути старт другої задачі, щоб уникнути синхронного старту
-                next_run_time=None
+                # перший запуск на 30 сек пізніше, щоб не стартувати одночасно з розсилками.
+                # next_run_time=None поставив би задачу на паузу: рядки MessageAfterStart
+                # (DRIP_MODE=rows і старі користувачі lazy режиму) не надсилались би
+                next_run_time=timezone.now() + timedelta(seconds=30)
             )
 
+            scheduler.add_job(
+                send_drip_messages,
+                "interval",
+                minutes=1,
+                id='drip_messages',
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1,
+                misfire_grace_time=60
+            )
+
+            scheduler.add_job(
+                reconcile_counters_job,
+                "interval",
+                hours=1,
+                id='reconcile_counters',
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1,
+                misfire_grace_time=600
+            )
+
+            scheduler.add_job(
+                flush_events_job,
+                "interval",
+                minutes=1,
+                id='flush_events',
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1,
+                misfire_grace_time=60
+            )
+
+            if METRICS_ENABLED:
+                scheduler.add_job(
+                    log_metrics_job,
+                    "interval",
+                    minutes=int(os.getenv('METRICS_LOG_INTERVAL', 5)),
+                    id='log_metrics',
+                    replace_existing=True,
+                    coalesce=True,
+                    max_instances=1,
+                    misfire_grace_time=60
+                )
+
+            if os.getenv('RETENTION_ENABLED', '0') == '1':
+                scheduler.add_job(
+                    apply_retention_job,
+                    "cron",
+                    hour=4,
+                    id='retention',
+                    replace_existing=True,
+                    coalesce=True,
+                    max_instances=1,
+                    misfire_grace_time=3600
+                )
+
+            # SIGUSR1 / SIGUSR2 - профіль CPU та знімок пам'яті (manage.py profile_bots)
+            install_signal_handlers(asyncio.get_running_loop())
+
             scheduler.start()
             logging.info("✅ Планувальник запущено")
             logging.info(f"📋 Активні завдання: {[job.id for job in scheduler.get_jobs()]}")
             await start_all_bots()
 
-        asyncio.run(main())
+        try:
+            asyncio.run(main())
+        finally:
+            # події, які ще не встигли записати
+            flush_events()
+            shutdown_db_pool()
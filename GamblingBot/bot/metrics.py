@@ -0,0 +1,191 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# Метрики апдейтів (час хендлера, запити до бази, запити до Telegram)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+# Апдейти, які обробляються довше (мс), логуються разом зі списком запитів
+SLOW_UPDATE_MS = float(os.getenv('SLOW_UPDATE_MS', 1000))
+# Скільки запитів до бази зберігається для логу повільного апдейту
+MAX_LOGGED_QUERIES = 50
+
+# Межі кошиків гістограм часу, мс
+TIME_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Межі кошиків гістограми кількості запитів до бази
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+@dataclass
+class UpdateMetrics:
+    """
+    Виміри одного апдейту. Доступні через current_update у хендлерах
+    та в потоках бази (db_async копіює контекст)
+    """
+    handler: str = "unhandled"
+    db_time: float = 0.0
+    api_time: float = 0.0
+    api_calls: int = 0
+    query_count: int = 0
+    queries: list = field(default_factory=list)
+
+
+current_update: contextvars.ContextVar[UpdateMetrics | None] = contextvars.ContextVar(
+    "current_update", default=None
+)
+
+
+class Histogram:
+    """
+    Гістограма з фіксованими кошиками: кількість значень у кожному кошику,
+    сума та максимум. Квантилі оцінюються верхньою межею кошика (не більше максимуму)
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count, 1) if self.count else 0,
+            "p50": round(self.quantile(0.5), 1),
+            "p95": round(self.quantile(0.95), 1),
+            "max": round(self.max, 1),
+        }
+
+
+# (bot_pk, хендлер) -> {метрика: Histogram}
+_histograms: dict = {}
+_lock = threading.Lock()
+
+
+def _new_histograms():
+    return {
+        "wall_ms": Histogram(TIME_BUCKETS),
+        "db_ms": Histogram(TIME_BUCKETS),
+        "api_ms": Histogram(TIME_BUCKETS),
+        "queries": Histogram(COUNT_BUCKETS),
+    }
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    execute_wrapper з'єднання: рахує запити апдейту, який їх виконав
+    """
+    metrics = current_update.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        metrics.query_count += 1
+        if len(metrics.queries) < MAX_LOGGED_QUERIES:
+            metrics.queries.append((sql, duration))
+
+
+def add_db_time(seconds):
+    """
+    Час очікування виклику бази (разом з чергою пулу) для поточного апдейту
+    """
+    metrics = current_update.get()
+    if metrics is not None:
+        metrics.db_time += seconds
+
+
+async def telegram_request_timer(make_request, bot, method):
+    """
+    Middleware сесії aiogram: час запитів до Telegram API поточного апдейту
+    """
+    metrics = current_update.get()
+    if metrics is None:
+        return await make_request(bot, method)
+
+    start = time.perf_counter()
+    try:
+        return await make_request(bot, method)
+    finally:
+        metrics.api_time += time.perf_counter() - start
+        metrics.api_calls += 1
+
+
+def observe_update(bot_pk, update_id, metrics: UpdateMetrics, wall: float):
+    """
+    Додає виміри апдейту в гістограми та логує повільний апдейт
+    """
+    wall_ms = wall * 1000
+    with _lock:
+        histograms = _histograms.get((bot_pk, metrics.handler))
+        if histograms is None:
+            histograms = _histograms[(bot_pk, metrics.handler)] = _new_histograms()
+        histograms["wall_ms"].observe(wall_ms)
+        histograms["db_ms"].observe(metrics.db_time * 1000)
+        histograms["api_ms"].observe(metrics.api_time * 1000)
+        histograms["queries"].observe(metrics.query_count)
+
+    if wall_ms < SLOW_UPDATE_MS:
+        return
+
+    queries = "".join(
+        f"\n  {duration * 1000:.1f} мс: {sql[:300]}" for sql, duration in metrics.queries
+    )
+    logger.warning(
+        f"🐢 Повільний апдейт {update_id} бота {bot_pk} ({metrics.handler}): "
+        f"{wall_ms:.0f} мс, база {metrics.db_time * 1000:.0f} мс / "
+        f"{metrics.query_count} запитів, Telegram {metrics.api_time * 1000:.0f} мс / "
+        f"{metrics.api_calls} запитів{queries}"
+    )
+
+
+def collect_metrics(reset=False):
+    """
+    {(bot_pk, хендлер): {метрика: summary}}. З reset=True гістограми очищаються
+    """
+    global _histograms
+    with _lock:
+        histograms = _histograms
+        if reset:
+            _histograms = {}
+    return {
+        key: {name: histogram.summary() for name, histogram in metrics.items()}
+        for key, metrics in histograms.items()
+    }
+
+
+async def log_metrics_job():
+    """
+    Логує гістограми за інтервал планувальника і починає новий інтервал
+    """
+    for (bot_pk, handler), metrics in sorted(collect_metrics(reset=True).items(), key=str):
+        logger.info(
+            f"📊 Бот {bot_pk}, {handler}: "
+            + ", ".join(f"{name} {summary}" for name, summary in metrics.items())
+        )
@@ -0,0 +1,188 @@
+import os
+import time
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+from redis import RedisError
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from .context import get_bot_context
+from .control import get_async_redis
+from .metrics import UpdateMetrics, current_update, observe_update
+
+# Не більше THROTTLE_LIMIT апдейтів від користувача за THROTTLE_WINDOW секунд
+THROTTLE_LIMIT = int(os.getenv('THROTTLE_LIMIT', 5))
+THROTTLE_WINDOW = float(os.getenv('THROTTLE_WINDOW', 10))
+# memory - окремо в кожному процесі, redis - спільно для всіх процесів
+THROTTLE_BACKEND = os.getenv('THROTTLE_BACKEND', 'memory')
+THROTTLE_MESSAGE = "Забагато натискань, спробуйте трохи пізніше"
+
+
+class BotContextMiddleware(BaseMiddleware):
+    """
+    Підставляє `bot_ctx` для бота, який отримав апдейт
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        bot_ctx = get_bot_context(data["bot"].id)
+        if bot_ctx is None:
+            logging.warning(f"Контекст для бота {data['bot'].id} не знайдено")
+            return None
+
+        data["bot_ctx"] = bot_ctx
+        return await handler(event, data)
+
+
+class MemoryThrottleBackend:
+    """
+    Ковзне вікно в пам'яті процесу: час останніх `limit` апдейтів на користувача
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._hits: dict[tuple, deque] = {}
+
+    async def hit(self, key, limit: int, window: float) -> bool:
+        now = time.monotonic()
+        hits = self._hits.get(key)
+        if hits is None:
+            if len(self._hits) >= self.max_keys:
+                self._prune(now, window)
+            hits = self._hits[key] = deque(maxlen=limit)
+
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+
+        if len(hits) >= limit:
+            return False
+
+        hits.append(now)
+        return True
+
+    def _prune(self, now, window):
+        stale = [key for key, hits in self._hits.items() if not hits or hits[-1] <= now - window]
+        for key in stale:
+            del self._hits[key]
+
+
+class RedisThrottleBackend:
+    """
+    Ковзне вікно в Redis (спільне для кількох процесів): поточний і попередній
+    інтервали, попередній враховується пропорційно.
+    Як і в MemoryThrottleBackend, відкинуті апдейти не рахуються
+    """
+
+    def __init__(self, prefix: str = "throttle"):
+        self.prefix = prefix
+
+    async def hit(self, key, limit: int, window: float) -> bool:
+        now = time.time()
+        bucket = int(now // window)
+        elapsed = (now % window) / window
+        base = f"{self.prefix}:{':'.join(map(str, key))}"
+
+        redis = get_async_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.incr(f"{base}:{bucket}")
+            pipe.expire(f"{base}:{bucket}", int(window * 2) + 1)
+            pipe.get(f"{base}:{bucket - 1}")
+            current, _, previous = await pipe.execute()
+
+        if int(previous or 0) * (1 - elapsed) + current <= limit:
+            return True
+        # інакше користувач, який продовжує надсилати, сам подовжував би блокування
+        await redis.decr(f"{base}:{bucket}")
+        return False
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Відкидає апдейти користувача, який надсилає більше `limit` апдейтів за `window` секунд
+    """
+
+    def __init__(self, limit: int = THROTTLE_LIMIT, window: float = THROTTLE_WINDOW, backend=None):
+        self.limit = limit
+        self.window = window
+        self.backend = backend or MemoryThrottleBackend()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        try:
+            allowed = await self.backend.hit((data["bot"].id, user.id), self.limit, self.window)
+        except RedisError as e:
+            logging.error(f"Помилка throttling backend: {e}")
+            allowed = True
+
+        if not allowed:
+            logging.warning(f"Забагато апдейтів від {user.id} для бота {data['bot'].id}, пропущено")
+            # інакше кнопка крутиться, поки Telegram не відкине запит
+            if event.callback_query:
+                try:
+                    await data["bot"].answer_callback_query(
+                        event.callback_query.id, text=THROTTLE_MESSAGE
+                    )
+                except Exception as e:
+                    logging.error(f"Не вдалося відповісти на callback {event.callback_query.id}: {e}")
+            return None
+
+        return await handler(event, data)
+
+
+def get_throttle_backend():
+    if THROTTLE_BACKEND == "redis":
+        return RedisThrottleBackend()
+    return MemoryThrottleBackend()
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Вимірює обробку апдейту: загальний час, час і запити до бази,
+    запити до Telegram. Має стояти після BotContextMiddleware
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        metrics = UpdateMetrics()
+        token = current_update.set(metrics)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            current_update.reset(token)
+            observe_update(data["bot_ctx"].bot.pk, event.update_id, metrics, time.perf_counter() - start)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """
+    Внутрішня middleware: записує в метрики апдейту назву хендлера, який його обробив
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        metrics = current_update.get()
+        if metrics is not None:
+            metrics.handler = data["handler"].callback.__name__
+        return await handler(event, data)
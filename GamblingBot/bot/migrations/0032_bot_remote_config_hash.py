@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0031_message_term'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bot',
+            name='remote_config_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='Хеш застосованих налаштувань Telegram'),
+        ),
+    ]
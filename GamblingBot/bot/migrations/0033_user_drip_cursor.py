@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0032_bot_remote_config_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='drip_cursor',
+            field=models.IntegerField(blank=True, default=None, help_text='Затримка (хв) останнього надісланого повідомлення після старту. -1 - ще нічого не надіслано, порожнє - користувач не в розсилці', null=True, verbose_name='Прогрес повідомлень після старту'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations, transaction
+from django.db.models import Count, Min
+
+# Скільки груп дублікатів обробляється в одній транзакції
+BATCH_SIZE = 500
+
+
+def merge_duplicate_users(apps, schema_editor):
+    """
+    Об'єднує користувачів з однаковими (bot, telegram_id): залишає найраніше
+    створеного, переносить на нього блогера, прогрес розсилки та MessageAfterStart
+    """
+    User = apps.get_model("bot", "User")
+    MessageAfterStart = apps.get_model("bot", "MessageAfterStart")
+
+    while True:
+        groups = list(
+            User.objects.values("bot_id", "telegram_id")
+            .annotate(n=Count("id"), keep_id=Min("id"))
+            .filter(n__gt=1)
+            .order_by("keep_id")[:BATCH_SIZE]
+        )
+        if not groups:
+            break
+
+        with transaction.atomic():
+            for group in groups:
+                users = list(
+                    User.objects.filter(
+                        bot_id=group["bot_id"], telegram_id=group["telegram_id"]
+                    ).order_by("id")
+                )
+                keep, duplicates = users[0], users[1:]
+                duplicate_ids = [user.pk for user in duplicates]
+
+                if keep.bloger_id is None:
+                    keep.bloger_id = next(
+                        (u.bloger_id for u in duplicates if u.bloger_id), None
+                    )
+                cursors = [u.drip_cursor for u in users if u.drip_cursor is not None]
+                # найбільший курсор - щоб не надіслати крок повторно
+                keep.drip_cursor = max(cursors) if cursors else None
+                keep.save(update_fields=["bloger", "drip_cursor"])
+
+                # повідомлення дубліката переносяться, лише якщо в залишеного їх немає,
+                # інакше кожен крок прийшов би двічі (решта видаляється каскадом)
+                if not MessageAfterStart.objects.filter(user_id=keep.pk).exists():
+                    first_duplicate = (
+                        MessageAfterStart.objects.filter(user_id__in=duplicate_ids)
+                        .order_by("id")
+                        .values_list("user_id", flat=True)
+                        .first()
+                    )
+                    MessageAfterStart.objects.filter(user_id=first_duplicate).update(
+                        user_id=keep.pk
+                    )
+                User.objects.filter(pk__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+    # кожен пакет комітиться окремо
+    atomic = False
+
+    dependencies = [
+        ("bot", "0033_user_drip_cursor"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0034_dedup_users'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messageafterstart',
+            index=models.Index(condition=models.Q(('sent', False)), fields=['send_at'], name='after_start_unsent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledmessage',
+            index=models.Index(condition=models.Q(('sent', False)), fields=['send_at'], name='scheduled_unsent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['bot', 'status'], name='user_bot_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['bot', 'joined_at'], name='user_bot_joined_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(fields=('bot', 'telegram_id'), name='unique_user_per_bot'),
+        ),
+    ]
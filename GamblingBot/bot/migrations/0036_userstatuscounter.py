@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model("bot", "User")
+    UserStatusCounter = apps.get_model("bot", "UserStatusCounter")
+
+    rows = User.objects.values("bot_id", "status").annotate(count=Count("id"))
+    UserStatusCounter.objects.bulk_create(
+        [UserStatusCounter(**row) for row in rows], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0035_user_constraints_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('active', 'Активний'), ('blocked', 'Заблокував бота'), ('deleted', 'Видалив акаунт'), ('forbidden', 'Інша помилка')], max_length=20)),
+                ('count', models.IntegerField(default=0, verbose_name='Кількість')),
+                ('bot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_counters', to='bot.bot')),
+            ],
+            options={
+                'verbose_name': 'Лічильник користувачів',
+                'verbose_name_plural': 'Лічильники користувачів',
+                'constraints': [models.UniqueConstraint(fields=('bot', 'status'), name='unique_status_counter')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0036_userstatuscounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('joins', models.PositiveIntegerField(default=0, verbose_name='Приєднались')),
+                ('first_messages', models.PositiveIntegerField(default=0, verbose_name='Отримали перше повідомлення')),
+                ('deliveries', models.PositiveIntegerField(default=0, verbose_name='Доставлено розсилок')),
+                ('blocks', models.PositiveIntegerField(default=0, verbose_name='Заблокували')),
+                ('deletes', models.PositiveIntegerField(default=0, verbose_name='Видалили акаунт')),
+                ('day', models.DateField(verbose_name='День')),
+                ('bloger', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='bot.bloger')),
+                ('bot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bot.bot')),
+            ],
+            options={
+                'verbose_name': 'Статистика за день',
+                'verbose_name_plural': 'Статистика за день',
+                'indexes': [models.Index(fields=['bot', 'day'], name='daily_bot_idx'), models.Index(fields=['bloger', 'day'], name='daily_bloger_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('joins', models.PositiveIntegerField(default=0, verbose_name='Приєднались')),
+                ('first_messages', models.PositiveIntegerField(default=0, verbose_name='Отримали перше повідомлення')),
+                ('deliveries', models.PositiveIntegerField(default=0, verbose_name='Доставлено розсилок')),
+                ('blocks', models.PositiveIntegerField(default=0, verbose_name='Заблокували')),
+                ('deletes', models.PositiveIntegerField(default=0, verbose_name='Видалили акаунт')),
+                ('hour', models.DateTimeField(verbose_name='Година')),
+                ('bloger', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='bot.bloger')),
+                ('bot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bot.bot')),
+            ],
+            options={
+                'verbose_name': 'Статистика за годину',
+                'verbose_name_plural': 'Статистика за годину',
+                'indexes': [models.Index(fields=['bot', 'hour'], name='hourly_bot_idx'), models.Index(fields=['bloger', 'hour'], name='hourly_bloger_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0037_stat_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledmessage',
+            name='delivered',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Доставлено'),
+        ),
+        migrations.AddField(
+            model_name='scheduledmessage',
+            name='failed',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Не доставлено'),
+        ),
+    ]
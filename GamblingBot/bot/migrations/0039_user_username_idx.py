@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0038_scheduledmessage_results'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['bot', 'username'], name='user_bot_username_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0039_user_username_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailystat',
+            name='drip_completed',
+            field=models.PositiveIntegerField(default=0, verbose_name='Отримали всі повідомлення після старту'),
+        ),
+        migrations.AddField(
+            model_name='hourlystat',
+            name='drip_completed',
+            field=models.PositiveIntegerField(default=0, verbose_name='Отримали всі повідомлення після старту'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:45
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def finish_completed_drips(apps, schema_editor):
+    """
+    Користувачі, які вже отримали останній крок кампанії, більше не потрібні
+    в індексі user_drip_pending_idx
+    """
+    Bot = apps.get_model("bot", "Bot")
+    Campain = apps.get_model("bot", "Campain")
+    User = apps.get_model("bot", "User")
+
+    for bot in Bot.objects.all():
+        if bot.use_our_messages:
+            campains = Campain.objects.filter(bot=bot)
+        else:
+            campains = Campain.objects.filter(folder_id=bot.folder_id)
+        last_delay = campains.aggregate(last=Max("delay_minutes"))["last"]
+        if last_delay is not None:
+            User.objects.filter(bot=bot, drip_cursor__gte=last_delay).update(drip_cursor=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0040_stat_rollup_drip_completed'),
+    ]
+
+    operations = [
+        migrations.RunPython(finish_completed_drips, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='drip_cursor',
+            field=models.IntegerField(blank=True, default=None, help_text='Затримка (хв) останнього надісланого повідомлення після старту. -1 - ще нічого не надіслано, порожнє - користувач не в розсилці або вже отримав усі повідомлення', null=True, verbose_name='Прогрес повідомлень після старту'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('drip_cursor__isnull', False)), fields=['bot', 'joined_at'], name='user_drip_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0041_user_drip_pending_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='joined_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Додався в'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-19 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0042_user_joined_at_default'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_drip_pending_idx',
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('drip_cursor__isnull', False)), fields=['bot', 'drip_cursor', 'joined_at'], name='user_drip_pending_idx'),
+        ),
+    ]
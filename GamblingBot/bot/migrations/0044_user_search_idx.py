@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-19 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0043_user_drip_pending_idx_cursor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['telegram_id'], name='user_telegram_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['username'], name='user_username_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_bot_username_idx',
+        ),
+    ]
@@ -41,7 +41,20 @@ class User(models.Model):
         verbose_name="Статус користувача",
     )
 
-    joined_at = models.DateTimeField(verbose_name="Додався в", auto_now_add=True)
+    # не auto_now_add: імпорт і копіювання аудиторії зберігають дату приєднання
+    joined_at = models.DateTimeField(
+        verbose_name="Додався в", default=timezone.now, editable=False
+    )
+
+    drip_cursor = models.IntegerField(
+        null=True,
+        blank=True,
+        default=None,
+        verbose_name="Прогрес повідомлень після старту",
+        help_text="Затримка (хв) останнього надісланого повідомлення після старту. "
+        "-1 - ще нічого не надіслано, порожнє - користувач не в розсилці "
+        "або вже отримав усі повідомлення",
+    )
 
     def __str__(self):
         return self.first_name
@@ -49,6 +62,24 @@ class User(models.Model):
     class Meta:
         verbose_name = "Користувач"
         verbose_name_plural = "Користувачі"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bot", "telegram_id"], name="unique_user_per_bot"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["bot", "status"], name="user_bot_status_idx"),
+            models.Index(fields=["bot", "joined_at"], name="user_bot_joined_idx"),
+            # користувачі, яким ще належать повідомлення після старту (DRIP_MODE=lazy)
+            models.Index(
+                fields=["bot", "drip_cursor", "joined_at"],
+                condition=models.Q(drip_cursor__isnull=False),
+                name="user_drip_pending_idx",
+            ),
+            # пошук в адмінці, в тому числі без фільтра за ботом
+            models.Index(fields=["telegram_id"], name="user_telegram_id_idx"),
+            models.Index(fields=["username"], name="user_username_idx"),
+        ]
 
 
 class Message(models.Model):
@@ -143,10 +174,23 @@ class ScheduledMessage(models.Model):
     send_at = models.DateTimeField(verbose_name="Час відправки", default=timezone.now)
 
     sent = models.BooleanField(default=False, verbose_name="Відправлено")
+    delivered = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Доставлено"
+    )
+    failed = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Не доставлено"
+    )
 
     class Meta:
         verbose_name = "Заплановане повідомлення"
         verbose_name_plural = "Заплановані повідомлення"
+        indexes = [
+            models.Index(
+                fields=["send_at"],
+                condition=models.Q(sent=False),
+                name="scheduled_unsent_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.text[:30]}... scheduled for {self.send_at}"
@@ -191,6 +235,15 @@ class MessageAfterStart(models.Model):
 
     sent = models.BooleanField(default=False, verbose_name="Відправлено")
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["send_at"],
+                condition=models.Q(sent=False),
+                name="after_start_unsent_idx",
+            ),
+        ]
+
 
 class Bot(models.Model):
     name = models.CharField(max_length=100, verbose_name="Назва бота")
@@ -227,6 +280,13 @@ class Bot(models.Model):
     miniapp_link = models.URLField(
         null=True, blank=True, verbose_name="Посилання на сайт для miniapp"
     )
+    remote_config_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Хеш застосованих налаштувань Telegram",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -244,6 +304,76 @@ class BotStatistics(models.Model):
         verbose_name_plural = "Статистика бота"
 
 
+class UserStatusCounter(models.Model):
+    """
+    Кількість користувачів бота з певним статусом, оновлюється разом зі
+    статусом користувача (bot/counters.py)
+    """
+    bot = models.ForeignKey(
+        "Bot", on_delete=models.CASCADE, related_name="status_counters"
+    )
+    status = models.CharField(max_length=20, choices=UserStatus.choices)
+    count = models.IntegerField(default=0, verbose_name="Кількість")
+
+    class Meta:
+        verbose_name = "Лічильник користувачів"
+        verbose_name_plural = "Лічильники користувачів"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bot", "status"], name="unique_status_counter"
+            ),
+        ]
+
+
+class StatRollup(models.Model):
+    """
+    Лічильники подій бота та блогера за період (bot/rollups.py)
+    """
+    bot = models.ForeignKey("Bot", on_delete=models.CASCADE)
+    bloger = models.ForeignKey(
+        "Bloger", on_delete=models.SET_NULL, null=True, blank=True
+    )
+    joins = models.PositiveIntegerField(default=0, verbose_name="Приєднались")
+    first_messages = models.PositiveIntegerField(
+        default=0, verbose_name="Отримали перше повідомлення"
+    )
+    deliveries = models.PositiveIntegerField(
+        default=0, verbose_name="Доставлено розсилок"
+    )
+    blocks = models.PositiveIntegerField(default=0, verbose_name="Заблокували")
+    deletes = models.PositiveIntegerField(default=0, verbose_name="Видалили акаунт")
+    drip_completed = models.PositiveIntegerField(
+        default=0, verbose_name="Отримали всі повідомлення після старту"
+    )
+
+    class Meta:
+        abstract = True
+
+
+class HourlyStat(StatRollup):
+    hour = models.DateTimeField(verbose_name="Година")
+
+    class Meta:
+        verbose_name = "Статистика за годину"
+        verbose_name_plural = "Статистика за годину"
+        indexes = [
+            models.Index(fields=["bot", "hour"], name="hourly_bot_idx"),
+            models.Index(fields=["bloger", "hour"], name="hourly_bloger_idx"),
+        ]
+
+
+class DailyStat(StatRollup):
+    day = models.DateField(verbose_name="День")
+
+    class Meta:
+        verbose_name = "Статистика за день"
+        verbose_name_plural = "Статистика за день"
+        indexes = [
+            models.Index(fields=["bot", "day"], name="daily_bot_idx"),
+            models.Index(fields=["bloger", "day"], name="daily_bloger_idx"),
+        ]
+
+
 class Folder(models.Model):
     name = models.CharField(max_length=100, verbose_name="Папка")
 
@@ -0,0 +1,107 @@
+import time
+import logging
+
+import redis
+
+from .models import Bot, Folder
+from .control import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Лічильник версії дерева навігації адмінки: збільшується при зміні
+# папок і ботів, кожен процес адмінки звіряється з ним
+NAV_VERSION_KEY = "admin:nav:version"
+VERSION_CHECK_INTERVAL = 2
+
+_tree = None
+_version = None
+_checked_at = 0.0
+
+
+def clear_nav_cache():
+    global _tree
+    _tree = None
+
+
+def bump_nav_version():
+    """
+    Скидає дерево в поточному процесі та в усіх інших процесах адмінки
+    """
+    clear_nav_cache()
+    try:
+        get_redis().incr(NAV_VERSION_KEY)
+    except redis.RedisError as e:
+        logger.error(f"Не вдалося оновити версію навігації: {e}")
+
+
+def _check_version():
+    global _version, _checked_at
+
+    now = time.monotonic()
+    if now - _checked_at < VERSION_CHECK_INTERVAL:
+        return
+    _checked_at = now
+
+    try:
+        version = get_redis().get(NAV_VERSION_KEY)
+    except redis.RedisError as e:
+        logger.error(f"Не вдалося перевірити версію навігації: {e}")
+        clear_nav_cache()
+        return
+
+    if version != _version:
+        _version = version
+        clear_nav_cache()
+
+
+def bot_models(bot_id):
+    return [
+        {"name": "Користувачі", "admin_url": f"/admin/bot/user/?bot__id__exact={bot_id}"},
+        {"name": "Повідомлення", "admin_url": f"/admin/bot/message/?bot__id__exact={bot_id}"},
+        {"name": "Блогери", "admin_url": f"/admin/bot/bloger/?bot__id__exact={bot_id}"},
+        {"name": "Заплановані повідомлення", "admin_url": f"/admin/bot/scheduledmessage/?bot__id__exact={bot_id}"},
+        {"name": "Повідомлення після старту", "admin_url": f"/admin/bot/campain/?bot__id__exact={bot_id}"},
+        {"name": "Черга повідомлень після старту", "admin_url": f"/admin/bot/messageafterstart/?bot__id__exact={bot_id}"},
+        {"name": "Статистика", "admin_url": f"/admin/bot/botstatistics/?bot__id__exact={bot_id}"},
+    ]
+
+
+def build_nav_tree():
+    folders = {
+        folder_id: {
+            "name": name,
+            "id": f"folder_{folder_id}",
+            "bots": [],
+            "folder_id": folder_id,
+        }
+        for folder_id, name in Folder.objects.order_by("pk").values_list("pk", "name")
+    }
+    # боти без папки - окрема група в кінці
+    no_folder = {"name": "Без папки", "id": "folder_none", "bots": [], "folder_id": None}
+
+    for bot_id, name, folder_id in Bot.objects.order_by("pk").values_list("pk", "name", "folder_id"):
+        folder = folders.get(folder_id, no_folder)
+        folder["bots"].append({
+            "name": name,
+            "app_label": f"bot_{bot_id}",
+            "bot_id": bot_id,
+            "models": bot_models(bot_id),
+        })
+
+    tree = list(folders.values())
+    if no_folder["bots"]:
+        tree.append(no_folder)
+    return tree
+
+
+def get_nav_tree():
+    """
+    Дерево папок і ботів для бокової панелі адмінки
+    """
+    global _tree
+    _check_version()
+
+    tree = _tree
+    if tree is None:
+        tree = _tree = build_nav_tree()
+    return tree
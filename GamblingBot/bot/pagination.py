@@ -0,0 +1,43 @@
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+# Точний COUNT(*) рахується лише до цієї кількості рядків
+COUNT_LIMIT = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагінатор без повного COUNT(*): кількість береться з `estimate`
+    (наприклад, з лічильників UserStatusCounter), а якщо її немає -
+    рахується не далі за COUNT_LIMIT рядків
+    """
+
+    def __init__(self, *args, estimate=None, **kwargs):
+        self.estimate = estimate
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.estimate is not None:
+            return self.estimate
+        return self.object_list.order_by().values("pk")[:COUNT_LIMIT].count()
+
+
+class CursorChangeList(ChangeList):
+    """
+    ChangeList з посиланням на наступну сторінку через `id__lt` (keyset):
+    глибокі сторінки не потребують OFFSET. Адмінка має сортувати за -pk
+    """
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        only = getattr(self.model_admin, "list_only", None)
+        return queryset.only(*only) if only else queryset
+
+    @property
+    def next_cursor_url(self):
+        results = list(self.result_list)
+        if len(results) < self.list_per_page:
+            return None
+        return self.get_query_string({"id__lt": results[-1].pk}, ["p"])
@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import signal
+import asyncio
+import logging
+import threading
+import tracemalloc
+from pathlib import Path
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Куди складаються профілі та знімки пам'яті процесу runbots
+# (порожнє значення - каталог profiles поруч з manage.py)
+PROFILE_DIR = Path(os.getenv('PROFILE_DIR') or settings.BASE_DIR / 'profiles')
+PROFILE_DURATION = int(os.getenv('PROFILE_DURATION', 30))
+# Інтервал між вибірками стеків, сек
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.01))
+# Глибина стеків tracemalloc
+TRACEMALLOC_FRAMES = int(os.getenv('TRACEMALLOC_FRAMES', 10))
+TOP_LINES = 50
+
+PROFILER_ACTIONS = ("profile", "dump_tasks", "memory_start", "memory_snapshot", "memory_stop")
+
+# Фонові задачі профайлера, щоб їх не прибрав garbage collector
+_background_tasks = set()
+_profiling = False
+# Попередній знімок tracemalloc для порівняння
+_last_snapshot = None
+
+
+def _dump_path(kind, suffix="txt") -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    return PROFILE_DIR / f"{kind}-{os.getpid()}-{timezone.localtime():%Y%m%d-%H%M%S}.{suffix}"
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class SamplingProfiler(threading.Thread):
+    """
+    Семплінговий профайлер: кожні `interval` секунд знімає стеки всіх потоків
+    через sys._current_frames(). Процес не сповільнюється трасуванням,
+    тому його можна вмикати на живому runbots
+    """
+
+    def __init__(self, duration=PROFILE_DURATION, interval=PROFILE_INTERVAL):
+        super().__init__(name="profiler", daemon=True)
+        self.duration = duration
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+
+    def run(self):
+        thread_names = {}
+        deadline = time.monotonic() + self.duration
+        while time.monotonic() < deadline:
+            for thread in threading.enumerate():
+                thread_names[thread.ident] = thread.name
+
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def write(self):
+        """
+        Зберігає стеки у folded форматі (для flamegraph.pl / speedscope)
+        та топ функцій за власним часом. Повертає шлях до folded файлу
+        """
+        folded = _dump_path("cpu", "folded")
+        with open(folded, "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+        # власний час функції окремо для кожного потоку: очікування в потоках
+        # бази не змішується з роботою циклу подій
+        own = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[f"{frames[0]}: {frames[-1]}"] += count
+        with open(folded.with_suffix(".top.txt"), "w", encoding="utf-8") as file:
+            file.write(f"Вибірок: {self.samples}, інтервал {self.interval} сек\n\n")
+            for name, count in own.most_common(TOP_LINES):
+                file.write(f"{count * 100 / max(self.samples, 1):6.1f}%  {name}\n")
+        return folded
+
+
+def dump_tasks():
+    """
+    Стеки всіх asyncio задач циклу подій. Викликається з циклу подій
+    """
+    path = _dump_path("tasks")
+    tasks = asyncio.all_tasks()
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(f"Задач: {len(tasks)}\n")
+        for task in sorted(tasks, key=lambda task: task.get_name()):
+            file.write(f"\n{task.get_name()}: {task.get_coro().__qualname__}\n")
+            for frame in task.get_stack():
+                file.write(f"  {_frame_name(frame)}\n")
+    return path
+
+
+async def run_profile(duration=PROFILE_DURATION, interval=PROFILE_INTERVAL):
+    """
+    Профіль CPU на `duration` секунд, після нього - стеки asyncio задач
+    """
+    global _profiling
+    profiler = SamplingProfiler(duration, interval)
+    logger.info(f"🔬 Профілювання на {duration} сек")
+    try:
+        profiler.start()
+        await asyncio.to_thread(profiler.join)
+        folded = await asyncio.to_thread(profiler.write)
+        tasks = dump_tasks()
+    finally:
+        _profiling = False
+    logger.info(f"🔬 Профіль збережено: {folded}, задачі: {tasks}")
+
+
+def _spawn(coro):
+    task = asyncio.get_running_loop().create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def start_profile(duration=PROFILE_DURATION, interval=PROFILE_INTERVAL):
+    """
+    Запускає профілювання у фоні, якщо воно ще не йде
+    """
+    global _profiling
+    if _profiling:
+        logger.warning("Профілювання вже запущено")
+        return
+    _profiling = True
+    _spawn(run_profile(duration, interval))
+
+
+def memory_snapshot():
+    """
+    Знімок tracemalloc і різниця з попереднім знімком (або топ алокацій для першого).
+    Якщо tracemalloc вимкнений - вмикає його, знімок буде наступного разу
+    """
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        memory_start()
+        return None
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    path = _dump_path("memory")
+    current, peak = tracemalloc.get_traced_memory()
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(f"Зараз {current / 2**20:.1f} МБ, пік {peak / 2**20:.1f} МБ\n\n")
+        if _last_snapshot is None:
+            stats = snapshot.statistics("traceback")
+        else:
+            file.write("Різниця з попереднім знімком\n\n")
+            stats = snapshot.compare_to(_last_snapshot, "traceback")
+        for stat in stats[:TOP_LINES]:
+            file.write(f"{stat}\n")
+            for line in stat.traceback.format(limit=TRACEMALLOC_FRAMES):
+                file.write(f"  {line}\n")
+    _last_snapshot = snapshot
+    logger.info(f"🧠 Знімок пам'яті збережено: {path}")
+    return path
+
+
+def memory_start(frames=TRACEMALLOC_FRAMES):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        logger.info(f"🧠 tracemalloc увімкнено ({frames} кадрів)")
+
+
+def memory_stop():
+    global _last_snapshot
+    tracemalloc.stop()
+    _last_snapshot = None
+    logger.info("🧠 tracemalloc вимкнено")
+
+
+async def handle_profiler_command(command):
+    """
+    Команди профайлера з каналу керування (manage.py profile_bots)
+    """
+    action = command["action"]
+    if action == "profile":
+        start_profile(
+            int(command.get("duration") or PROFILE_DURATION),
+            float(command.get("interval") or PROFILE_INTERVAL),
+        )
+    elif action == "dump_tasks":
+        logger.info(f"🔬 Задачі збережено: {dump_tasks()}")
+    elif action == "memory_start":
+        memory_start(int(command.get("frames") or TRACEMALLOC_FRAMES))
+    elif action == "memory_snapshot":
+        await asyncio.to_thread(memory_snapshot)
+    elif action == "memory_stop":
+        memory_stop()
+
+
+def install_signal_handlers(loop):
+    """
+    SIGUSR1 - профіль CPU на PROFILE_DURATION секунд, SIGUSR2 - знімок пам'яті.
+    На Windows сигналів немає, лишається лише канал керування
+    """
+    if not hasattr(signal, "SIGUSR1"):
+        return
+    loop.add_signal_handler(signal.SIGUSR1, start_profile)
+    loop.add_signal_handler(signal.SIGUSR2, lambda: _spawn(asyncio.to_thread(memory_snapshot)))
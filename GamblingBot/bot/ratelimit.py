@@ -0,0 +1,24 @@
+import os
+import asyncio
+
+# Ліміт повідомлень на секунду для одного бота (Telegram дозволяє ~30)
+TELEGRAM_RATE_LIMIT = float(os.getenv('TELEGRAM_RATE_LIMIT', 25))
+
+
+class RateLimiter:
+    """
+    Рівномірно розподіляє виклики: не більше `rate` на секунду.
+    Кожен виклик резервує свій слот, тому очікування не блокує інших
+    """
+
+    def __init__(self, rate: float = TELEGRAM_RATE_LIMIT):
+        self.interval = 1 / rate
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
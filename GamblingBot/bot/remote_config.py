@@ -0,0 +1,46 @@
+import json
+import hashlib
+
+from aiogram.types import MenuButtonWebApp, WebAppInfo, MenuButtonDefault
+
+from .models import Bot
+from .db import db_write
+
+
+def remote_config_hash(bot_obj):
+    """
+    Хеш налаштувань бота на стороні Telegram (кнопка меню, вебхук)
+    """
+    payload = json.dumps({
+        'token': bot_obj.token,
+        'button_text': bot_obj.button_text,
+        'miniapp_link': bot_obj.miniapp_link,
+        'webhook': None,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def apply_remote_config(bot_obj, bot_instance):
+    """
+    Застосовує кнопку меню та видаляє вебхук, якщо налаштування змінились
+    з моменту останнього запуску
+    """
+    config_hash = remote_config_hash(bot_obj)
+    if bot_obj.remote_config_hash == config_hash:
+        return False
+
+    if bot_obj.button_text and bot_obj.miniapp_link:
+        await bot_instance.set_chat_menu_button(
+            menu_button=MenuButtonWebApp(
+                text=bot_obj.button_text,
+                web_app=WebAppInfo(url=bot_obj.miniapp_link)
+            )
+        )
+    else:
+        await bot_instance.set_chat_menu_button(menu_button=MenuButtonDefault())
+
+    await bot_instance.delete_webhook()
+
+    await db_write(Bot.objects.filter(pk=bot_obj.pk).update)(remote_config_hash=config_hash)
+    bot_obj.remote_config_hash = config_hash
+    return True
@@ -0,0 +1,152 @@
+import os
+import gzip
+import json
+import logging
+from pathlib import Path
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MessageAfterStart, ScheduledMessage, HourlyStat
+from .db import db_write
+
+logger = logging.getLogger(__name__)
+
+# Куди складаються архіви видалених рядків (gzip NDJSON)
+# (порожнє значення - каталог archive поруч з manage.py)
+ARCHIVE_DIR = Path(os.getenv('RETENTION_ARCHIVE_DIR') or settings.BASE_DIR / 'archive')
+# Скільки рядків видаляється однією короткою транзакцією
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', 1000))
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    Рядки `model`, у яких `date_field` старше `keep_days` днів
+    (і які підходять під `filters`), архівуються та видаляються
+    """
+    name: str
+    model: type
+    date_field: str
+    keep_days: int
+    filters: tuple = ()
+
+    def queryset(self, now=None):
+        cutoff = (now or timezone.now()) - timezone.timedelta(days=self.keep_days)
+        return self.model.objects.filter(
+            **{f"{self.date_field}__lt": cutoff}, **dict(self.filters)
+        )
+
+
+POLICIES = {
+    policy.name: policy
+    for policy in (
+        # повідомлення після старту, які так і не вдалося надіслати
+        RetentionPolicy(
+            "after_start",
+            MessageAfterStart,
+            "send_at",
+            int(os.getenv('RETENTION_AFTER_START_DAYS', 7)),
+        ),
+        RetentionPolicy(
+            "scheduled",
+            ScheduledMessage,
+            "send_at",
+            int(os.getenv('RETENTION_SCHEDULED_DAYS', 30)),
+            (("sent", True),),
+        ),
+        # денна статистика лишається, погодинна потрібна лише для недавніх днів
+        RetentionPolicy(
+            "hourly_stats",
+            HourlyStat,
+            "hour",
+            int(os.getenv('RETENTION_HOURLY_STATS_DAYS', 90)),
+        ),
+    )
+}
+
+
+def archive_path(policy: RetentionPolicy, started_at) -> Path:
+    return ARCHIVE_DIR / f"{policy.name}-{started_at:%Y%m%d-%H%M%S}.ndjson.gz"
+
+
+def _merge_part(part: Path, path: Path):
+    """
+    Дописує файл пачки в архів (gzip допускає кілька склеєних частин).
+    Якщо не вдалося - .part файл лишається поруч з архівом
+    """
+    try:
+        with open(path, "ab") as archive, open(part, "rb") as batch:
+            archive.write(batch.read())
+        part.unlink()
+    except OSError as e:
+        logger.error(f"Не вдалося дописати {part} в архів {path}: {e}")
+
+
+def archive_batch(policy: RetentionPolicy, path: Path, batch_size=RETENTION_BATCH_SIZE, dry_run=False):
+    """
+    Архівує та видаляє одну пачку рядків. Повертає кількість рядків.
+    Пачка пишеться в окремий .part файл і потрапляє в архів лише після
+    коміту видалення - невдала транзакція не лишає дублікатів в архіві
+    """
+    with transaction.atomic():
+        pks = list(
+            policy.queryset()
+            .select_for_update(skip_locked=True)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not pks or dry_run:
+            return len(pks)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        part = path.with_name(f"{path.name}.{pks[0]}-{pks[-1]}.part")
+        try:
+            with gzip.open(part, "wt", encoding="utf-8") as batch:
+                for row in policy.model.objects.filter(pk__in=pks).values():
+                    batch.write(json.dumps(row, default=str, ensure_ascii=False) + "\n")
+
+            policy.model.objects.filter(pk__in=pks).delete()
+        except Exception:
+            part.unlink(missing_ok=True)
+            raise
+
+        # у черзі записів це savepoint - файл дописується після коміту всього пакета
+        transaction.on_commit(lambda: _merge_part(part, path))
+    return len(pks)
+
+
+def apply_policy(policy: RetentionPolicy, batch_size=RETENTION_BATCH_SIZE, dry_run=False):
+    """
+    Проходить політику пачками до кінця. Повертає кількість рядків
+    """
+    if dry_run:
+        return policy.queryset().count()
+
+    path = archive_path(policy, timezone.now())
+    total = 0
+    while True:
+        archived = archive_batch(policy, path, batch_size)
+        total += archived
+        if archived < batch_size:
+            break
+    return total
+
+
+async def apply_retention_job():
+    """
+    Те саме для планувальника runbots: кожна пачка - окремий запис у черзі
+    записів, тож обробка апдейтів між пачками не зупиняється
+    """
+    for policy in POLICIES.values():
+        path = archive_path(policy, timezone.now())
+        total = 0
+        while True:
+            archived = await db_write(archive_batch)(policy, path)
+            total += archived
+            if archived < RETENTION_BATCH_SIZE:
+                break
+        if total:
+            logger.info(f"Політика {policy.name}: заархівовано {total} рядків у {path}")
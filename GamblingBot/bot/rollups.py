@@ -0,0 +1,144 @@
+import logging
+import threading
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Bot, Bloger, HourlyStat, DailyStat
+from .db import db_write
+
+logger = logging.getLogger(__name__)
+
+# Поля StatRollup, які можна збільшувати через record_event
+EVENTS = ("joins", "first_messages", "deliveries", "blocks", "deletes", "drip_completed")
+
+# (година, bot_pk, bloger_pk, подія) -> кількість, ще не записана в базу
+_pending: Counter = Counter()
+# буфер поповнюється в циклі подій, а забирається потоком бази
+_lock = threading.Lock()
+
+
+def record_event(bot_pk, bloger_pk, event, count=1):
+    """
+    Додає подію в буфер процесу, без звернення до бази.
+    В базу буфер записує flush_events
+    """
+    if event not in EVENTS:
+        raise ValueError(f"Невідома подія {event}")
+
+    hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+    with _lock:
+        _pending[(hour, bot_pk, bloger_pk, event)] += count
+
+
+def _group(pending):
+    """
+    {(період, bot_pk, bloger_pk): {подія: кількість}} для годин і днів.
+    Події видалених ботів відкидаються, видалених блогерів - йдуть без блогера
+    """
+    bots = set(
+        Bot.objects.filter(pk__in={key[1] for key in pending}).values_list("pk", flat=True)
+    )
+    blogers = set(
+        Bloger.objects.filter(pk__in={key[2] for key in pending if key[2]})
+        .values_list("pk", flat=True)
+    )
+
+    hourly, daily = {}, {}
+    for (hour, bot_pk, bloger_pk, event), count in pending.items():
+        if bot_pk not in bots:
+            continue
+        if bloger_pk not in blogers:
+            bloger_pk = None
+        day = timezone.localtime(hour).date()
+        for rows, period in ((hourly, hour), (daily, day)):
+            fields = rows.setdefault((period, bot_pk, bloger_pk), Counter())
+            fields[event] += count
+    return hourly, daily
+
+
+def _increment(model, period_field, rows):
+    for (period, bot_pk, bloger_pk), fields in rows.items():
+        lookup = {period_field: period, "bot_id": bot_pk, "bloger_id": bloger_pk}
+        updated = model.objects.filter(**lookup).update(
+            **{event: F(event) + count for event, count in fields.items()}
+        )
+        if not updated:
+            model.objects.create(**lookup, **fields)
+
+
+def flush_events():
+    """
+    Записує накопичені події в HourlyStat та DailyStat однією транзакцією.
+    Якщо запис не вдався, події повертаються в буфер
+    """
+    global _pending
+    with _lock:
+        pending, _pending = _pending, Counter()
+    if not pending:
+        return 0
+
+    try:
+        with transaction.atomic():
+            hourly, daily = _group(pending)
+            _increment(HourlyStat, "hour", hourly)
+            _increment(DailyStat, "day", daily)
+    except Exception:
+        with _lock:
+            _pending.update(pending)
+        raise
+
+    return sum(pending.values())
+
+
+async def flush_events_job():
+    try:
+        flushed = await db_write(flush_events)()
+    except Exception as e:
+        logger.error(f"Не вдалося записати статистику подій: {e}", exc_info=True)
+        return
+    logger.debug(f"Записано подій: {flushed}")
+
+
+# Колонки рейтингу блогерів, за якими можна сортувати
+LEADERBOARD_ORDERING = (
+    "joins", "net_joins", "block_ratio", "drip_ratio", "blocks", "drip_completed",
+)
+
+
+def _per_hundred(part, whole):
+    return round(part * 100 / whole, 1) if whole else 0
+
+
+def get_bloger_leaderboard(date_from, date_to, bot_pks=None, order="joins"):
+    """
+    Рейтинг блогерів за період з DailyStat - по рядку на блогера і день,
+    без звернення до таблиці користувачів.
+    Події не прив'язані до дня приєднання користувача: блокування і завершення
+    за період можуть бути від тих, хто приєднався раніше. Тому показники -
+    кількість подій на 100 приєднань за той самий період, і вони можуть бути більшими за 100
+    """
+    rows = DailyStat.objects.filter(day__range=(date_from, date_to), bloger__isnull=False)
+    if bot_pks is not None:
+        rows = rows.filter(bot_id__in=bot_pks)
+
+    leaderboard = []
+    for row in (
+        rows.values("bloger_id", "bloger__name", "bot__name")
+        .annotate(**{event: Sum(event) for event in EVENTS})
+    ):
+        joins = row["joins"]
+        row.update(
+            net_joins=joins - row["blocks"] - row["deletes"],
+            block_ratio=_per_hundred(row["blocks"], joins),
+            drip_ratio=_per_hundred(row["drip_completed"], joins),
+        )
+        leaderboard.append(row)
+
+    if order.lstrip("-") not in LEADERBOARD_ORDERING:
+        order = "joins"
+    # за замовчуванням від більшого до меншого, "-" - навпаки
+    leaderboard.sort(key=lambda row: row[order.lstrip("-")], reverse=not order.startswith("-"))
+    return leaderboard
@@ -2,7 +2,6 @@ import asyncio
 import mimetypes
 import logging
 from datetime import datetime
-from asgiref.sync import sync_to_async
 from aiogram import Bot
 from aiogram.types import FSInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -11,8 +10,16 @@ from aiogram.exceptions import (
     TelegramBadRequest,
     TelegramRetryAfter,
 )
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from .models import User, ScheduledMessage, MessageAfterStart, UserStatus
+from .db import db_async, db_write
+from .context import bot_contexts
+from .config_cache import get_bot_config
+from .user_cache import user_cache
+from .services import change_user_status
+from .rollups import record_event
 
 # Налаштування логера
 logger = logging.getLogger(__name__)
@@ -23,6 +30,9 @@ if not logger.handlers:
     file_handler.setFormatter(formatter)
     logger.addHandler(file_handler)
 
+# Скільки користувачів обробляється за один запит у lazy розсилці
+DRIP_BATCH_SIZE = 500
+
 
 def get_keyboard(button_text: str, url: str):
     logger.debug(f"🔘 Створення клавіатури з текстом: {button_text} та URL: {url}")
@@ -31,6 +41,23 @@ def get_keyboard(button_text: str, url: str):
     return kb.as_markup()
 
 
+async def set_user_status(user, status):
+    """
+    Записує новий статус користувача (User або CachedUser), лише якщо він змінився
+    """
+    if user.status == status:
+        return
+
+    user.status = status
+    changed = await db_write(change_user_status)(user.pk, status)
+    user_cache.set_status(user.bot_id, user.telegram_id, status)
+
+    if changed and status == UserStatus.BLOCKED:
+        record_event(user.bot_id, user.bloger_id, "blocks")
+    elif changed and status == UserStatus.DELETED:
+        record_event(user.bot_id, user.bloger_id, "deletes")
+
+
 async def send_message_safe(
     bot: Bot,
     user,
@@ -95,32 +122,31 @@ async def send_message_safe(
         logger.info(
             f"✅ Повідомлення успішно надіслано користувачу {user.telegram_id} за {duration:.2f} сек"
         )
-        user.status = UserStatus.ACTIVE
-        await sync_to_async(user.save)(update_fields=["status"])
+        await set_user_status(user, UserStatus.ACTIVE)
         return sent
 
     except TelegramForbiddenError as e:
         txt = str(e).lower()
         if "blocked" in txt:
-            user.status = UserStatus.BLOCKED
+            status = UserStatus.BLOCKED
             logger.warning(f"🚫 Користувач {user.telegram_id} заблокував бота")
         else:
-            user.status = UserStatus.FORBIDDEN
+            status = UserStatus.FORBIDDEN
             logger.warning(
                 f"⛔ Доступ заборонено для користувача {user.telegram_id}: {e}"
             )
-        await sync_to_async(user.save)(update_fields=["status"])
+        await set_user_status(user, status)
         return False
 
     except TelegramBadRequest as e:
         txt = str(e).lower()
         if "deactivated" in txt or "chat not found" in txt:
-            user.status = UserStatus.DELETED
+            status = UserStatus.DELETED
             logger.warning(f"❌ Аккаунт/чат {user.telegram_id} недоступний: {e}")
         else:
-            user.status = UserStatus.FORBIDDEN
+            status = UserStatus.FORBIDDEN
             logger.warning(f"🚫 Помилка запиту для {user.telegram_id}: {e}")
-        await sync_to_async(user.save)(update_fields=["status"])
+        await set_user_status(user, status)
         return False
 
     except TelegramRetryAfter as e:
@@ -138,20 +164,47 @@ async def send_message_safe(
         logger.error(
             f"❌ Невідома помилка при відправці {user.telegram_id}: {e}", exc_info=True
         )
-        user.status = UserStatus.FORBIDDEN
-        await sync_to_async(user.save)(update_fields=["status"])
+        await set_user_status(user, UserStatus.FORBIDDEN)
         return False
 
 
+def finish_message_after_start(msg):
+    """
+    Видаляє надіслане повідомлення після старту.
+    Повертає True, якщо це було останнє повідомлення користувача
+    """
+    msg.delete()
+    return not MessageAfterStart.objects.filter(user_id=msg.user_id).exists()
+
+
+def claim_messages_after_start(limit):
+    """
+    Забирає рядки MessageAfterStart, яким настав час, і позначає їх sent=True.
+    SKIP LOCKED - рядки, які вже забрав інший процес, пропускаються
+    """
+    with transaction.atomic():
+        messages = list(
+            MessageAfterStart.objects.select_related("user__bloger", "bot")
+            .select_for_update(skip_locked=True, of=("self",))
+            .filter(send_at__lte=timezone.now(), sent=False)
+            .order_by("send_at", "pk")[:limit]
+        )
+        if messages:
+            MessageAfterStart.objects.filter(
+                pk__in=[msg.pk for msg in messages]
+            ).update(sent=True)
+    return messages
+
+
 async def send_messages_after_start():
+    """
+    Відправляє рядки MessageAfterStart (режим DRIP_MODE=rows та користувачі,
+    які зареєструвались до переходу на lazy режим)
+    """
     start_time = datetime.now()
     logger.info("🔄 Початок відправки повідомлень після старту")
 
-    messages = await sync_to_async(list)(
-        ScheduledMessage.objects.filter(
-            send_at__lte=timezone.now(), sent=False
-        ).select_for_update()
-    )
+    messages = await db_write(claim_messages_after_start)(DRIP_BATCH_SIZE)
 
     logger.info(f"📨 Знайдено {len(messages)} повідомлень для відправки після старту")
 
@@ -162,9 +215,9 @@ async def send_messages_after_start():
         media_file = FSInputFile(msg.media.path) if msg.media else None
         mime, _ = mimetypes.guess_type(msg.media.path) if msg.media else (None, None)
 
-        user = await sync_to_async(lambda: msg.user)()
-        bloger = await sync_to_async(lambda: user.bloger)()
-        bot_obj = await sync_to_async(lambda: msg.bot)()
+        user = msg.user
+        bloger = user.bloger
+        bot_obj = msg.bot
         if not bot_obj:
             logger.warning(f"⚠️ Бот не знайдено для msg {msg.id}")
             continue
@@ -181,11 +234,17 @@ async def send_messages_after_start():
 
         if sent_msg:
             # видаляємо/позначаємо після успіху
-            await sync_to_async(msg.delete)()
+            last = await db_write(finish_message_after_start)(msg)
             logger.debug(
                 f"🗑 Видалено повідомлення ID: {msg.id} після успішної відправки"
             )
+            if last:
+                record_event(bot_obj.pk, user.bloger_id, "drip_completed")
         else:
+            # повертаємо в чергу для наступного запуску
+            await db_write(
+                MessageAfterStart.objects.filter(pk=msg.pk).update
+            )(sent=False)
             logger.warning(
                 f"⚠️ Повідомлення ID {msg.id} не було відправлено; залишено в базі"
             )
@@ -199,13 +258,182 @@ async def send_messages_after_start():
     )
 
 
+def claim_drip_users(bot_pk, prev_delay, delay_minutes, next_delay, now, limit):
+    """
+    Вибирає користувачів, яким настав час кроку з затримкою `delay_minutes`
+    і які вже отримали попередній крок (`prev_delay`, None - це перший крок),
+    і одразу пересуває їх курсор, щоб крок не відправився двічі.
+    Пропущені через затримку планувальника кроки надсилаються по черзі,
+    а не відкидаються. Після останнього кроку (`next_delay` None) курсор
+    стає NULL - користувач випадає з індексу user_drip_pending_idx.
+    SKIP LOCKED - користувачі, яких уже забрав інший процес, пропускаються
+    """
+    filters = {
+        "bot_id": bot_pk,
+        "drip_cursor__isnull": False,
+        "drip_cursor__lt": delay_minutes,
+        "joined_at__lte": now - timezone.timedelta(minutes=delay_minutes),
+    }
+    if prev_delay is not None:
+        filters["drip_cursor__gte"] = prev_delay
+
+    with transaction.atomic():
+        users = list(
+            User.objects.select_for_update(skip_locked=True)
+            .filter(**filters)
+            .order_by("joined_at", "pk")[:limit]
+        )
+        if users:
+            User.objects.filter(pk__in=[user.pk for user in users]).update(
+                drip_cursor=delay_minutes if next_delay is not None else None
+            )
+    return users
+
+
+def release_drip_users(users, delay_minutes, next_delay):
+    """
+    Повертає курсор користувачам, яким не вдалося надіслати крок
+    (`users` - екземпляри з claim_drip_users, з курсором до claim),
+    щоб наступний запуск спробував ще раз
+    """
+    claimed = delay_minutes if next_delay is not None else None
+    by_cursor = {}
+    for user in users:
+        by_cursor.setdefault(user.drip_cursor, []).append(user.pk)
+
+    with transaction.atomic():
+        for cursor, pks in by_cursor.items():
+            User.objects.filter(pk__in=pks, drip_cursor=claimed).update(drip_cursor=cursor)
+
+
+async def send_drip_messages():
+    """
+    Повідомлення після старту в режимі DRIP_MODE=lazy: крок кампанії з затримкою d
+    отримують користувачі з joined_at + d <= now, у яких попередній крок <= drip_cursor < d.
+    Якщо користувачу не вдалося нічого надіслати, курсор повертається назад
+    """
+    start_time = datetime.now()
+    logger.info("🔄 Початок відправки повідомлень після старту (lazy)")
+
+    semaphore = asyncio.Semaphore(10)
+
+    async def send_with_limit(tg_bot, user, campain, keyboard):
+        async with semaphore:
+            media_file = FSInputFile(campain.media.path) if campain.media else None
+            mime, _ = (
+                mimetypes.guess_type(campain.media.path)
+                if campain.media
+                else (None, None)
+            )
+            return bool(
+                await send_message_safe(
+                    tg_bot, user, campain.text, keyboard, media_file, mime
+                )
+            )
+
+    for bot_ctx in list(bot_contexts.values()):
+        config = await get_bot_config(bot_ctx.bot.pk)
+        if not config.campains:
+            continue
+
+        steps = {}
+        for campain in config.campains:
+            steps.setdefault(campain.delay_minutes, []).append(campain)
+
+        now = timezone.now()
+        delays = sorted(steps)
+        for prev_delay, delay_minutes, next_delay in zip(
+            [None] + delays[:-1], delays, delays[1:] + [None]
+        ):
+            failed = []
+            while True:
+                users = await db_write(claim_drip_users)(
+                    config.bot.pk, prev_delay, delay_minutes, next_delay, now,
+                    DRIP_BATCH_SIZE,
+                )
+                if not users:
+                    break
+
+                tasks = []
+                per_user = len(steps[delay_minutes])
+                for user in users:
+                    bloger = config.blogers.get(user.bloger_id)
+                    for campain in steps[delay_minutes]:
+                        keyboard = (
+                            get_keyboard(campain.button_text, bloger.ref_link_to_site)
+                            if bloger
+                            else None
+                        )
+                        tasks.append(
+                            send_with_limit(bot_ctx.tg_bot, user, campain, keyboard)
+                        )
+
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                logger.info(
+                    f"📊 Бот {config.bot.username}, крок {delay_minutes} хв: "
+                    f"✅ {len([r for r in results if r is True])}, "
+                    f"❌ {len([r for r in results if r is not True])}"
+                )
+
+                for i, user in enumerate(users):
+                    user_results = results[i * per_user:(i + 1) * per_user]
+                    if next_delay is None and all(r is True for r in user_results):
+                        record_event(user.bot_id, user.bloger_id, "drip_completed")
+                    # нічого не надіслано (мережа, невідома помилка) - крок повториться
+                    # в наступному запуску; тим, хто заблокував бота, не повторюємо
+                    elif not any(r is True for r in user_results) and user.status not in (
+                        UserStatus.BLOCKED, UserStatus.DELETED
+                    ):
+                        failed.append(user)
+
+            # курсор повертається після всього кроку: інакше ці ж користувачі
+            # знову потрапили б у claim цього запуску
+            if failed:
+                await db_write(release_drip_users)(failed, delay_minutes, next_delay)
+                logger.warning(
+                    f"⚠️ Бот {config.bot.username}, крок {delay_minutes} хв: "
+                    f"{len(failed)} користувачів залишено для повторної спроби"
+                )
+
+    total_duration = (datetime.now() - start_time).total_seconds()
+    logger.info(
+        f"🏁 Завершено відправку повідомлень після старту (lazy). Час: {total_duration:.2f} сек"
+    )
+
+
+def claim_scheduled_messages():
+    """
+    Забирає розсилки, яким настав час, позначає їх sent=True і одразу
+    завантажує ботів кожної розсилки. Повертає [(msg, bots), ...]
+    """
+    with transaction.atomic():
+        messages = list(
+            ScheduledMessage.objects.select_related("bot")
+            .select_for_update(skip_locked=True, of=("self",))
+            .filter(send_at__lte=timezone.now(), sent=False)
+            .order_by("send_at", "pk")
+        )
+        if messages:
+            ScheduledMessage.objects.filter(
+                pk__in=[msg.pk for msg in messages]
+            ).update(sent=True)
+
+    claimed = []
+    for msg in messages:
+        msg.sent = True
+        if msg.folder_id:
+            bots_list = list(msg.folder.bots.all())
+        else:
+            bots_list = [msg.bot]
+        claimed.append((msg, bots_list))
+    return claimed
+
+
 async def send_scheduled_messages():
     start_time = datetime.now()
     logger.info("🔄 Початок відправки запланованих повідомлень")
 
-    messages = await sync_to_async(list)(
-        ScheduledMessage.objects.filter(send_at__lte=timezone.now(), sent=False)
-    )
+    messages = await db_write(claim_scheduled_messages)()
 
     logger.info(f"📨 Знайдено {len(messages)} запланованих повідомлень")
 
@@ -244,6 +472,7 @@ async def send_scheduled_messages():
                 )
                 duration = (datetime.now() - start).total_seconds()
                 if sent:
+                    record_event(user.bot_id, user.bloger_id, "deliveries")
                     logger.debug(
                         f"✅ Відправлено користувачу {user.telegram_id} за {duration:.2f} сек"
                     )
@@ -260,20 +489,14 @@ async def send_scheduled_messages():
                 )
                 return False
 
-    for msg in messages:
+    for msg, bots_list in messages:
         msg_start = datetime.now()
         logger.info(f"📝 Обробка повідомлення ID: {msg.id}")
-
-        # Позначати як 'in progress' або видаляти після успіху — тут ставимо sent=True перед відправкою, але можна змінити на після успіху
-        msg.sent = True
-        await sync_to_async(msg.save)()
         logger.debug(f"💾 Повідомлення {msg.id} позначено як відправлене")
 
-        if await sync_to_async(lambda: msg.folder_id)():
-            bots_list = await sync_to_async(lambda: list(msg.folder.bots.all()))()
+        if msg.folder_id:
             logger.info(f"🤖 Відправка через {len(bots_list)} ботів з папки")
         else:
-            bots_list = [await sync_to_async(lambda: msg.bot)()]
             logger.info("🤖 Відправка через один бот")
 
         for bot_obj in bots_list:
@@ -284,7 +507,7 @@ async def send_scheduled_messages():
             async with Bot(bot_obj.token) as bot_instance:
                 logger.info(f"🤖 Обробка бота: {bot_obj.username}")
 
-                users = await sync_to_async(list)(
+                users = await db_async(list)(
                     User.objects.select_related("bloger").filter(bot=bot_obj).distinct()
                 )
 
@@ -305,6 +528,8 @@ async def send_scheduled_messages():
 
                 logger.info(f"📦 Розділено на {len(chunks)} частин по 5 повідомлень")
 
+                bot_delivered = bot_failed = 0
+
                 for i, chunk in enumerate(chunks, 1):
                     chunk_start = datetime.now()
                     logger.info(
@@ -318,6 +543,9 @@ async def send_scheduled_messages():
                         [r for r in results if r is False or isinstance(r, Exception)]
                     )
 
+                    bot_delivered += successful
+                    bot_failed += failed
+
                     chunk_duration = (datetime.now() - chunk_start).total_seconds()
                     logger.info(
                         f"📊 Частина {i}: ✅ Успішно: {successful}, ❌ Помилок: {failed}, ⏱ Час: {chunk_duration:.2f} сек"
@@ -325,6 +553,11 @@ async def send_scheduled_messages():
 
                     await asyncio.sleep(1)
 
+                await db_write(ScheduledMessage.objects.filter(pk=msg.pk).update)(
+                    delivered=F("delivered") + bot_delivered,
+                    failed=F("failed") + bot_failed,
+                )
+
                 bot_duration = (datetime.now() - msg_start).total_seconds()
                 logger.info(
                     f"⏱ Час роботи з ботом {bot_obj.username}: {bot_duration:.2f} сек"
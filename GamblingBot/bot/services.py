@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import User, Bloger, MessageAfterStart
+from .counters import move_status_counter
+
+
+def get_ref_bloger(ref_code, config):
+    """
+    Повертає блогера з коду `ref_<id>` серед блогерів бота або None
+    """
+    if not ref_code or not ref_code.startswith("ref_"):
+        return None
+
+    bloger_id = ref_code.split("_")[1]
+    if not bloger_id.isdigit():
+        return None
+
+    return config.blogers.get(int(bloger_id))
+
+
+def register_user(bot, bloger, tg_user, campains):
+    """
+    Реєструє користувача після /start однією транзакцією: створює користувача,
+    збільшує лічильник блогера та додає повідомлення після старту.
+    Повертає (user, created)
+    """
+    lazy_drip = settings.DRIP_MODE == "lazy"
+
+    with transaction.atomic():
+        user, created = User.objects.get_or_create(
+            telegram_id=tg_user.id,
+            bot=bot,
+            defaults={
+                "username": tg_user.username,
+                "first_name": tg_user.first_name,
+                "last_name": tg_user.last_name,
+                "bloger": bloger,
+                "drip_cursor": -1 if lazy_drip else None,
+            },
+        )
+        if not created:
+            return user, created
+
+        if bloger:
+            Bloger.objects.filter(pk=bloger.pk).update(
+                invited_people=F("invited_people") + 1
+            )
+
+        if lazy_drip:
+            return user, created
+
+        now = timezone.now()
+        MessageAfterStart.objects.bulk_create(
+            [
+                MessageAfterStart(
+                    bot=bot,
+                    user=user,
+                    text=campain.text,
+                    button_text=campain.button_text,
+                    media=campain.media,
+                    send_at=now + timezone.timedelta(minutes=campain.delay_minutes),
+                )
+                for campain in campains
+            ]
+        )
+
+    return user, created
+
+
+def change_user_status(user_pk, status):
+    """
+    Змінює статус користувача разом з лічильниками статусів.
+    Повертає False, якщо статус уже був таким
+    """
+    with transaction.atomic():
+        row = (
+            User.objects.select_for_update()
+            .filter(pk=user_pk)
+            .values_list("bot_id", "status")
+            .first()
+        )
+        if row is None or row[1] == status:
+            return False
+
+        bot_pk, old_status = row
+        User.objects.filter(pk=user_pk).update(status=status)
+        move_status_counter(bot_pk, old_status, status)
+    return True
@@ -1,16 +1,18 @@
-import asyncio
 import logging
 
-from aiogram import Bot as AioBot
-from aiogram.types import MenuButtonWebApp, WebAppInfo, MenuButtonDefault
-
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
 
-from .models import Bloger, Bot
-from .bot_instance import setup_and_start
+from .models import Bloger, Bot, Campain, Folder, Message, User
+from .control import publish_control
+from .config_cache import bump_config_version
+from .user_cache import user_cache
+from .counters import bump_status_counter, move_status_counter
+from .nav_cache import bump_nav_version
+from .remote_config import remote_config_hash
+from .tasks import task_runner, sync_bot_menu
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -24,6 +26,56 @@ console_handler.setFormatter(formatter)
 if not logger.handlers:
     logger.addHandler(console_handler)
 
+@receiver([post_save, post_delete], sender=Bot)
+@receiver([post_save, post_delete], sender=Bloger)
+@receiver([post_save, post_delete], sender=Message)
+@receiver([post_save, post_delete], sender=Campain)
+@receiver([post_save, post_delete], sender=Folder)
+def invalidate_config_cache(sender, instance, **kwargs):
+    transaction.on_commit(bump_config_version)
+
+@receiver([post_save, post_delete], sender=Bot)
+@receiver([post_save, post_delete], sender=Folder)
+def invalidate_nav_cache(sender, instance, **kwargs):
+    transaction.on_commit(bump_nav_version)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, created=False, **kwargs):
+    # новий користувач ще не міг потрапити в кеш
+    if created:
+        return
+
+    bot_pk, telegram_id = instance.bot_id, instance.telegram_id
+    user_cache.invalidate(bot_pk, telegram_id)
+    transaction.on_commit(
+        lambda: publish_control('invalidate_user', bot_pk=bot_pk, telegram_id=telegram_id)
+    )
+
+@receiver(pre_save, sender=User)
+def remember_user_status(sender, instance, **kwargs):
+    if instance._state.adding or instance.pk is None:
+        instance._old_status = None
+        return
+    instance._old_status = (
+        User.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    )
+
+@receiver(post_save, sender=User)
+def update_status_counter(sender, instance, created, **kwargs):
+    if created:
+        bump_status_counter(instance.bot_id, instance.status, 1)
+        return
+
+    old_status = getattr(instance, '_old_status', None)
+    if old_status and old_status != instance.status:
+        move_status_counter(instance.bot_id, old_status, instance.status)
+    instance._old_status = instance.status
+
+@receiver(post_delete, sender=User)
+def decrease_status_counter(sender, instance, **kwargs):
+    bump_status_counter(instance.bot_id, instance.status, -1, create=False)
+
 @receiver(post_save, sender=Bloger)
 def generate_ref_link(sender, instance, created, **kwargs):
     if created and not instance.ref_link_to_bot:
@@ -31,39 +83,40 @@ def generate_ref_link(sender, instance, created, **kwargs):
         instance.ref_link_to_bot = f'https://t.me/{bot_username}?start=ref_{instance.id}'
         instance.save(update_fields=["ref_link_to_bot"])
 
-@receiver(post_save, sender=Bot)
-def start_new_bot(sender, instance, created, **kwargs):
-    if not created:
+@receiver(pre_save, sender=Bot)
+def remember_bot_token(sender, instance, **kwargs):
+    if instance._state.adding or instance.pk is None:
+        instance._old_token = None
         return
+    instance._old_token = (
+        Bot.objects.filter(pk=instance.pk).values_list('token', flat=True).first()
+    )
 
-    logger.info(f'Створено нового бота {instance.id}')
+@receiver(post_save, sender=Bot)
+def reload_bot(sender, instance, created, **kwargs):
+    if created:
+        logger.info(f'Створено нового бота {instance.id}')
+    # polling залежить лише від токена: назву, папку та повідомлення бот
+    # бере з кешу конфігурації, кнопку меню застосовує update_bot_menu
+    elif getattr(instance, '_old_token', None) == instance.token:
+        return
+    instance._old_token = instance.token
 
-    def run_bot():
-        asyncio.run(setup_and_start(instance))
+    bot_pk = instance.pk
+    transaction.on_commit(lambda: publish_control('reload', bot_pk=bot_pk))
 
-    import threading
-    transaction.on_commit(lambda: threading.Thread(target=run_bot).start())
+@receiver(post_delete, sender=Bot)
+def stop_bot(sender, instance, **kwargs):
+    bot_pk = instance.pk
+    transaction.on_commit(lambda: publish_control('stop', bot_pk=bot_pk))
 
 @receiver(post_save, sender=Bot)
 def update_bot_menu(sender, instance: Bot, **kwargs):
-    if not instance.token:
+    # кнопка меню та токен не змінились з моменту останнього застосування
+    if not instance.token or instance.remote_config_hash == remote_config_hash(instance):
         return
 
-    async def set_menu():
-        bot = AioBot(token=instance.token)
-        try:
-            if instance.button_text and instance.miniapp_link:
-                await bot.set_chat_menu_button(
-                    menu_button=MenuButtonWebApp(
-                        text=instance.button_text,
-                        web_app=WebAppInfo(url=instance.miniapp_link)
-                    )
-                )
-
-                logger.info(f'Меню змінено для ботa {instance.username}')
-            else:
-                await bot.set_chat_menu_button(menu_button=MenuButtonDefault())
-        finally:
-            await bot.session.close()
-
-    asyncio.run(set_menu())
\ No newline at end of file
+    bot_pk = instance.pk
+    transaction.on_commit(
+        lambda: task_runner.submit(sync_bot_menu, bot_pk, key=f'menu:{bot_pk}')
+    )
@@ -0,0 +1,55 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+
+# Скільки секунд повторний виклик з тим самим ключем вважається дублікатом
+SINGLEFLIGHT_TTL = float(os.getenv('SINGLEFLIGHT_TTL', 5))
+
+
+class SingleFlight:
+    """
+    Об'єднує одночасні виклики з однаковим ключем в одне виконання.
+    Результат ще `ttl` секунд віддається повторним викликам без виконання.
+    `do` повертає (результат, чи був виклик дублікатом)
+    """
+
+    def __init__(self, ttl: float = SINGLEFLIGHT_TTL):
+        self.ttl = ttl
+        self._inflight: dict = {}
+        self._results = OrderedDict()
+
+    async def do(self, key, func, *args, **kwargs):
+        self._prune()
+
+        if key in self._results:
+            return self._results[key][1], True
+
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        # щоб не було попередження, якщо на помилку ніхто не чекав
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            self._results.pop(key, None)
+            self._results[key] = (time.monotonic() + self.ttl, result)
+            return result, False
+        finally:
+            del self._inflight[key]
+
+    def _prune(self):
+        now = time.monotonic()
+        while self._results:
+            key, (expires_at, _) = next(iter(self._results.items()))
+            if expires_at > now:
+                break
+            del self._results[key]
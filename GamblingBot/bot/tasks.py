@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import logging
+import threading
+
+import redis
+
+from aiogram import Bot as AiogramBot
+from aiogram.types import User as TelegramUser
+
+from .models import Bot
+from .db import db_async
+from .remote_config import apply_remote_config
+from .control import get_redis
+from .utils import check_bot
+
+logger = logging.getLogger(__name__)
+
+# Скільки секунд зберігається відповідь getMe для токена
+GET_ME_CACHE_TTL = 24 * 3600
+GET_ME_TIMEOUT = 15
+
+
+class TaskRunner:
+    """
+    Фонові задачі адмінки (запити до Telegram): один потік з власним
+    циклом подій, запит адмінки не чекає на результат.
+    Задача з тим самим `key`, поставлена пізніше, скасовує ще не виконану
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+        self._latest = {}
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="tasks", daemon=True
+                ).start()
+            return self._loop
+
+    def submit(self, func, *args, key=None):
+        """
+        Ставить корутинну функцію `func(*args)` в чергу, повертає
+        concurrent.futures.Future
+        """
+        marker = object()
+        if key is not None:
+            self._latest[key] = marker
+
+        async def run():
+            if key is not None and self._latest.get(key) is not marker:
+                return None
+            try:
+                return await func(*args)
+            except Exception as e:
+                logger.error(f"Помилка фонової задачі {func.__name__}: {e}", exc_info=True)
+                raise
+            finally:
+                if key is not None and self._latest.get(key) is marker:
+                    del self._latest[key]
+
+        return asyncio.run_coroutine_threadsafe(run(), self._get_loop())
+
+
+task_runner = TaskRunner()
+
+
+async def sync_bot_menu(bot_pk):
+    """
+    Застосовує кнопку меню бота в Telegram за поточними даними з бази
+    """
+    bot_obj = await db_async(Bot.objects.filter(pk=bot_pk).first)()
+    if bot_obj is None or not bot_obj.token:
+        return False
+
+    async with AiogramBot(token=bot_obj.token) as bot_instance:
+        changed = await apply_remote_config(bot_obj, bot_instance)
+    if changed:
+        logger.info(f"Меню змінено для бота {bot_obj.username}")
+    return changed
+
+
+def get_bot_info(token: str):
+    """
+    Відповідь getMe для токена (як check_bot: User або виняток).
+    Успішна відповідь кешується в Redis за хешем токена
+    """
+    key = f"tg:getme:{hashlib.sha256(token.encode()).hexdigest()}"
+    try:
+        cached = get_redis().get(key)
+    except redis.RedisError as e:
+        logger.error(f"Не вдалося прочитати кеш getMe: {e}")
+        cached = None
+    if cached:
+        return TelegramUser.model_validate_json(cached)
+
+    bot_info = task_runner.submit(check_bot, token).result(timeout=GET_ME_TIMEOUT)
+    if isinstance(bot_info, TelegramUser):
+        try:
+            get_redis().set(key, bot_info.model_dump_json(), ex=GET_ME_CACHE_TTL)
+        except redis.RedisError as e:
+            logger.error(f"Не вдалося зберегти кеш getMe: {e}")
+    return bot_info
@@ -1,3 +1,539 @@
-from django.test import TestCase
+import gzip
+import asyncio
+import json
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.db.models import Count, QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .models import Bot, Bloger, DailyStat, MessageAfterStart, User, UserStatus, UserStatusCounter
+from .sender import (
+    claim_drip_users, claim_messages_after_start, send_drip_messages, send_messages_after_start,
+)
+from .services import change_user_status
+from .counters import get_status_stats, reconcile_status_counters
+from .retention import POLICIES, archive_batch
+from .rollups import get_bloger_leaderboard
+from .imports import _insert, copy_users, import_users
+from .metrics import UpdateMetrics, current_update
+from .timer import TimerService
+from . import pagination
+from .admin import UserAdmin
+from .bot_instance import scheduler, spawn_update
+from .management.commands import runbots
+
+
+def make_user(bot, telegram_id, minutes_ago=0, **fields):
+    return User.objects.create(
+        bot=bot,
+        telegram_id=telegram_id,
+        joined_at=timezone.now() - timezone.timedelta(minutes=minutes_ago),
+        **fields,
+    )
+
+
+class ClaimDripUsersTests(TestCase):
+    def setUp(self):
+        self.bot = Bot.objects.create(name="test", token="1:test")
+        self.now = timezone.now()
+
+    def claim(self, prev_delay, delay, next_delay):
+        users = claim_drip_users(self.bot.pk, prev_delay, delay, next_delay, self.now, 100)
+        return sorted(user.telegram_id for user in users)
+
+    def cursor(self, telegram_id):
+        return User.objects.get(bot=self.bot, telegram_id=telegram_id).drip_cursor
+
+    def test_step_takes_users_whose_delay_has_passed(self):
+        make_user(self.bot, 1, minutes_ago=5, drip_cursor=-1)
+        make_user(self.bot, 2, minutes_ago=40, drip_cursor=-1)
+        make_user(self.bot, 3, minutes_ago=120, drip_cursor=-1)
+
+        self.assertEqual(self.claim(None, 0, 30), [1, 2, 3])
+        self.assertEqual(self.claim(0, 30, 90), [2, 3])
+        self.assertEqual(self.cursor(1), 0)
+        self.assertEqual(self.cursor(2), 30)
+        self.assertEqual(self.cursor(3), 30)
+
+    def test_missed_steps_are_caught_up_in_order(self):
+        make_user(self.bot, 1, minutes_ago=120, drip_cursor=-1)
+
+        self.assertEqual(self.claim(0, 30, 90), [])
+        self.assertEqual(self.claim(30, 90, None), [])
+        self.assertEqual(self.claim(None, 0, 30), [1])
+        self.assertEqual(self.claim(0, 30, 90), [1])
+        self.assertEqual(self.claim(30, 90, None), [1])
+        self.assertIsNone(self.cursor(1))
+
+    def test_step_is_not_claimed_twice(self):
+        make_user(self.bot, 1, minutes_ago=5, drip_cursor=-1)
+
+        self.assertEqual(self.claim(None, 0, 30), [1])
+        self.assertEqual(self.claim(None, 0, 30), [])
+
+    def test_last_step_finishes_drip(self):
+        make_user(self.bot, 1, minutes_ago=120, drip_cursor=30)
+        make_user(self.bot, 2, minutes_ago=60, drip_cursor=30)
+
+        self.assertEqual(self.claim(30, 90, None), [1])
+        self.assertIsNone(self.cursor(1))
+        self.assertEqual(self.claim(30, 90, None), [])
+
+    def test_users_outside_drip_are_skipped(self):
+        make_user(self.bot, 1, minutes_ago=5, drip_cursor=None)
+        make_user(self.bot, 2, minutes_ago=5, drip_cursor=0)
+        other_bot = Bot.objects.create(name="other", token="2:test")
+        make_user(other_bot, 3, minutes_ago=5, drip_cursor=-1)
+
+        self.assertEqual(self.claim(None, 0, 30), [])
+
+
+class SendDripMessagesTests(TestCase):
+    def setUp(self):
+        self.bot = Bot.objects.create(name="test", token="1:test")
+        for telegram_id in range(1, 5):
+            make_user(self.bot, telegram_id, minutes_ago=5, drip_cursor=-1)
+        campain = SimpleNamespace(delay_minutes=0, text="hi", button_text="go", media=None)
+        self.config = SimpleNamespace(bot=self.bot, campains=[campain], blogers={})
+
+    async def send(self, tg_bot, user, *args):
+        # 1 - надіслано, 2 - мережева помилка, 3 - заблокував бота, 4 - невідома помилка
+        if user.telegram_id == 2:
+            raise ConnectionError("network")
+        if user.telegram_id == 3:
+            user.status = UserStatus.BLOCKED
+        if user.telegram_id == 4:
+            user.status = UserStatus.FORBIDDEN
+        return user.telegram_id == 1
+
+    async def run_drip(self):
+        with mock.patch.multiple(
+            "bot.sender",
+            bot_contexts={self.bot.pk: SimpleNamespace(bot=self.bot, tg_bot=None)},
+            get_bot_config=mock.AsyncMock(return_value=self.config),
+            send_message_safe=self.send,
+            db_write=sync_to_async,
+        ):
+            await send_drip_messages()
+        return await sync_to_async(
+            lambda: dict(User.objects.filter(bot=self.bot).values_list("telegram_id", "drip_cursor"))
+        )()
+
+    async def test_failed_sends_are_retried(self):
+        self.assertEqual(await self.run_drip(), {1: None, 2: -1, 3: None, 4: -1})
+
+        self.send = mock.AsyncMock(return_value=True)
+        self.assertEqual(await self.run_drip(), {1: None, 2: None, 3: None, 4: None})
+        self.assertEqual(self.send.await_count, 2)
+
+
+class MessagesAfterStartTests(TestCase):
+    def setUp(self):
+        self.bot = Bot.objects.create(name="test", token="1:test")
+        self.user = make_user(self.bot, 1)
+        now = timezone.now()
+        for text, minutes, sent in (("second", -5, False), ("first", -10, False),
+                                    ("sent", -20, True), ("future", 5, False)):
+            MessageAfterStart.objects.create(
+                bot=self.bot, user=self.user, text=text, button_text="go",
+                send_at=now + timezone.timedelta(minutes=minutes), sent=sent,
+            )
+
+    def unsent(self):
+        return sorted(MessageAfterStart.objects.filter(sent=False).values_list("text", flat=True))
+
+    def test_claim_takes_due_rows_once(self):
+        self.assertEqual([msg.text for msg in claim_messages_after_start(1)], ["first"])
+        self.assertEqual([msg.text for msg in claim_messages_after_start(10)], ["second"])
+        self.assertEqual(claim_messages_after_start(10), [])
+        self.assertEqual(self.unsent(), ["future"])
+
+    async def test_failed_row_is_returned_to_queue(self):
+        async def send(tg_bot, user, text, *args):
+            return text == "first"
+
+        with mock.patch.multiple(
+            "bot.sender", Bot=mock.MagicMock(), send_message_safe=send, db_write=sync_to_async,
+        ):
+            await send_messages_after_start()
+
+        texts = await sync_to_async(lambda: sorted(MessageAfterStart.objects.values_list("text", flat=True)))()
+        self.assertEqual(texts, ["future", "second", "sent"])
+        self.assertEqual(await sync_to_async(self.unsent)(), ["future", "second"])
+
+    def test_runbots_schedules_job(self):
+        jobs = {}
+
+        async def start_all_bots():
+            jobs.update({job.id: job.next_run_time for job in scheduler.get_jobs()})
+            scheduler.shutdown(wait=False)
+
+        with mock.patch.multiple(
+            runbots, start_all_bots=start_all_bots, install_signal_handlers=mock.DEFAULT,
+            flush_events=mock.DEFAULT, shutdown_db_pool=mock.DEFAULT,
+        ):
+            runbots.Command().handle()
+
+        self.assertIsNotNone(jobs["messages_after_start"])
+
+
+class StatusCounterTests(TestCase):
+    def setUp(self):
+        self.bot = Bot.objects.create(name="test", token="1:test")
+        self.users = [make_user(self.bot, telegram_id) for telegram_id in range(1, 6)]
+
+    def assert_counters_match_users(self):
+        actual = dict(
+            User.objects.filter(bot=self.bot)
+            .values_list("status")
+            .annotate(count=Count("id"))
+        )
+        counted = {
+            status: count
+            for status, count in UserStatusCounter.objects.filter(bot=self.bot)
+            .values_list("status", "count")
+            if count
+        }
+        self.assertEqual(counted, actual)
+
+    def test_new_users_are_counted(self):
+        self.assertEqual(get_status_stats([self.bot.pk]), {UserStatus.ACTIVE: 5})
+
+    def test_change_user_status_moves_counter(self):
+        self.assertTrue(change_user_status(self.users[0].pk, UserStatus.BLOCKED))
+        self.assertTrue(change_user_status(self.users[1].pk, UserStatus.DELETED))
+        self.assertTrue(change_user_status(self.users[0].pk, UserStatus.ACTIVE))
+
+        self.assert_counters_match_users()
+        stats = get_status_stats([self.bot.pk])
+        self.assertEqual(stats[UserStatus.ACTIVE], 4)
+        self.assertEqual(stats[UserStatus.DELETED], 1)
+
+    def test_same_status_is_not_counted_twice(self):
+        self.assertTrue(change_user_status(self.users[0].pk, UserStatus.BLOCKED))
+        self.assertFalse(change_user_status(self.users[0].pk, UserStatus.BLOCKED))
+
+        self.assert_counters_match_users()
+
+    def test_save_and_delete_keep_counters(self):
+        user = self.users[0]
+        user.status = UserStatus.FORBIDDEN
+        user.save()
+        self.users[1].delete()
+
+        self.assert_counters_match_users()
+
+    def test_reconcile_fixes_drift(self):
+        UserStatusCounter.objects.filter(bot=self.bot).update(count=100)
+        User.objects.filter(pk=self.users[0].pk).update(status=UserStatus.BLOCKED)
+
+        reconcile_status_counters([self.bot.pk])
+
+        self.assert_counters_match_users()
+
+
+class ArchiveBatchTests(TestCase):
+    def setUp(self):
+        self.bot = Bot.objects.create(name="test", token="1:test")
+        user = make_user(self.bot, 1)
+        old = timezone.now() - timezone.timedelta(days=POLICIES["after_start"].keep_days + 1)
+        for text, send_at in (("old 1", old), ("old 2", old), ("new", timezone.now())):
+            MessageAfterStart.objects.create(bot=self.bot, user=user, text=text, send_at=send_at)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = Path(directory.name)
+        self.path = self.dir / "after_start.ndjson.gz"
+
+    def archived(self):
+        if not self.path.exists():
+            return []
+        with gzip.open(self.path, "rt", encoding="utf-8") as archive:
+            return [json.loads(line)["text"] for line in archive]
+
+    def test_old_rows_are_archived_and_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            archived = archive_batch(POLICIES["after_start"], self.path)
+
+        self.assertEqual(archived, 2)
+        self.assertEqual(self.archived(), ["old 1", "old 2"])
+        self.assertEqual(list(MessageAfterStart.objects.values_list("text", flat=True)), ["new"])
+        self.assertEqual(list(self.dir.glob("*.part")), [])
+
+    def test_batches_are_appended(self):
+        for _ in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                archive_batch(POLICIES["after_start"], self.path, batch_size=1)
+
+        self.assertEqual(self.archived(), ["old 1", "old 2"])
+
+    def test_failed_delete_leaves_archive_untouched(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch.object(QuerySet, "delete", side_effect=DatabaseError("locked")):
+                with self.assertRaises(DatabaseError):
+                    archive_batch(POLICIES["after_start"], self.path)
+
+        self.assertEqual(self.archived(), [])
+        self.assertEqual(list(self.dir.glob("*.part")), [])
+        self.assertEqual(MessageAfterStart.objects.count(), 3)
+
+    def test_dry_run_changes_nothing(self):
+        self.assertEqual(archive_batch(POLICIES["after_start"], self.path, dry_run=True), 2)
+        self.assertEqual(MessageAfterStart.objects.count(), 3)
+        self.assertFalse(self.path.exists())
+
+
+class ImportUsersTests(TestCase):
+    def setUp(self):
+        self.bot = Bot.objects.create(name="test", token="1:test")
+        make_user(self.bot, 1)
+
+    def test_insert_counts_only_new_users(self):
+        users = [User(bot=self.bot, telegram_id=telegram_id) for telegram_id in (1, 2, 3, 3)]
+
+        self.assertEqual(_insert(self.bot, users), 2)
+        self.assertEqual(User.objects.filter(bot=self.bot).count(), 3)
+        self.assertEqual(_insert(self.bot, users), 0)
+
+    def test_insert_does_not_count_users_created_by_start(self):
+        users = [User(bot=self.bot, telegram_id=telegram_id) for telegram_id in (2, 3)]
+        bulk_create = User.objects.bulk_create
+
+        def start_then_insert(objs, **kwargs):
+            # /start між перевіркою існуючих і вставкою
+            make_user(self.bot, 3)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(User.objects, "bulk_create", side_effect=start_then_insert):
+            self.assertEqual(_insert(self.bot, users), 1)
+        self.assertEqual(User.objects.filter(bot=self.bot).count(), 3)
+
+    def test_insert_ignores_other_bots(self):
+        other_bot = Bot.objects.create(name="other", token="2:test")
+
+        self.assertEqual(_insert(other_bot, [User(bot=other_bot, telegram_id=1)]), 1)
+
+    def test_invalid_rows_are_skipped(self):
+        records = [
+            {"telegram_id": "2", "joined_at": "2024-01-02T03:04:05+00:00"},
+            {"telegram_id": ""},
+            {"telegram_id": "abc"},
+            {"username": "no_id"},
+            {"telegram_id": "3", "status": "unknown"},
+        ]
+
+        self.assertEqual(import_users(self.bot, records), (5, 2, 3))
+        user = User.objects.get(bot=self.bot, telegram_id=2)
+        self.assertEqual(user.joined_at.year, 2024)
+        self.assertEqual(User.objects.get(bot=self.bot, telegram_id=3).status, UserStatus.ACTIVE)
+        self.assertEqual(get_status_stats([self.bot.pk]), {UserStatus.ACTIVE: 3})
+
+    def test_copy_keeps_joined_at_and_resets_drip(self):
+        target = Bot.objects.create(name="target", token="2:test")
+        bloger = Bloger.objects.create(bot=self.bot, name="bloger")
+        make_user(self.bot, 2, minutes_ago=60 * 24, bloger=bloger, drip_cursor=30)
+
+        self.assertEqual(copy_users(self.bot, target), (2, 2, 0))
+        copy = User.objects.get(bot=target, telegram_id=2)
+        original = User.objects.get(bot=self.bot, telegram_id=2)
+        self.assertEqual(copy.joined_at, original.joined_at)
+        self.assertIsNone(copy.drip_cursor)
+        self.assertEqual(copy.bloger.name, "bloger")
+        self.assertEqual(copy.bloger.bot, target)
+
+
+def login_admin(client):
+    admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+    client.force_login(admin)
+
+
+class BlogerLeaderboardTests(TestCase):
+    def setUp(self):
+        self.bot = Bot.objects.create(name="test", token="1:test")
+        self.today = timezone.localdate()
+
+    def add_stat(self, bloger, days_ago=0, **events):
+        DailyStat.objects.create(
+            bot=self.bot, bloger=bloger, day=self.today - timezone.timedelta(days=days_ago), **events
+        )
+
+    def test_events_of_earlier_joins_can_exceed_period_joins(self):
+        bloger = Bloger.objects.create(bot=self.bot, name="bloger")
+        self.add_stat(bloger, days_ago=40, joins=10)
+        self.add_stat(bloger, days_ago=1, joins=2, blocks=3, deletes=1, drip_completed=3)
+        self.add_stat(bloger, joins=2, blocks=2)
+
+        [row] = get_bloger_leaderboard(self.today - timezone.timedelta(days=6), self.today)
+
+        self.assertEqual(row["joins"], 4)
+        self.assertEqual(row["net_joins"], -2)
+        self.assertEqual(row["block_ratio"], 125.0)
+        self.assertEqual(row["drip_ratio"], 75.0)
+
+    def test_ordering(self):
+        first = Bloger.objects.create(bot=self.bot, name="first")
+        second = Bloger.objects.create(bot=self.bot, name="second")
+        self.add_stat(first, joins=5, blocks=1)
+        self.add_stat(second, joins=1, blocks=1)
+
+        names = lambda order: [row["bloger__name"] for row in get_bloger_leaderboard(self.today, self.today, order=order)]
+
+        self.assertEqual(names("joins"), ["first", "second"])
+        self.assertEqual(names("block_ratio"), ["second", "first"])
+        self.assertEqual(names("-net_joins"), ["second", "first"])
+        self.assertEqual(names("unknown"), ["first", "second"])
+
+
+@override_settings(ALLOWED_HOSTS=["*"])
+class LeaderboardViewTests(TestCase):
+    def setUp(self):
+        login_admin(self.client)
+
+    def test_invalid_ids_are_ignored(self):
+        for query in ("bot__id__exact=abc", "folder__id__exact=1;", "bot__id__exact=&folder__id__exact=x"):
+            response = self.client.get(f"/admin/bot/bloger/leaderboard/?{query}")
+            self.assertEqual(response.status_code, 200, query)
+            self.assertEqual(response.context["filters"], {})
+
+    def test_valid_id_is_kept_in_filters(self):
+        bot = Bot.objects.create(name="test", token="1:test")
+
+        response = self.client.get(f"/admin/bot/bloger/leaderboard/?bot__id__exact={bot.pk}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["filters"], {"bot__id__exact": bot.pk})
+
+
+class TimerContextTests(SimpleTestCase):
+    async def test_delayed_calls_do_not_inherit_update(self):
+        timer = TimerService()
+        seen = []
+        done = asyncio.Event()
+
+        async def record():
+            seen.append(current_update.get())
+            done.set()
+
+        token = current_update.set(UpdateMetrics(handler="start"))
+        try:
+            timer.call_later(0, record)
+        finally:
+            current_update.reset(token)
+        await asyncio.wait_for(done.wait(), 1)
+
+        self.assertEqual(seen, [None])
+
+
+@override_settings(ALLOWED_HOSTS=["*"])
+class StatisticsChartViewTests(TestCase):
+    def setUp(self):
+        login_admin(self.client)
+
+    def test_invalid_ids_are_ignored(self):
+        for query in ("bot__id__exact=abc", "folder__id__exact=1;", "bloger=x&bot__id__exact="):
+            response = self.client.get(f"/admin/bot/botstatistics/chart/?{query}")
+            self.assertEqual(response.status_code, 200, query)
+            self.assertEqual(response.context["filters"], {})
+
+    def test_valid_ids_are_kept_in_filters(self):
+        response = self.client.get("/admin/bot/botstatistics/chart/?bot__id__exact=1&bloger=2")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["filters"], {"bot__id__exact": 1, "bloger": 2})
+
+
+@override_settings(ALLOWED_HOSTS=["*"])
+class KeysetPaginationTests(TestCase):
+    url = "/admin/bot/user/"
+
+    def setUp(self):
+        login_admin(self.client)
+        self.bot = Bot.objects.create(name="test", token="1:test")
+        self.users = [
+            make_user(self.bot, telegram_id, first_name=f"user {telegram_id}")
+            for telegram_id in range(1, 6)
+        ]
+        patcher = mock.patch.object(UserAdmin, "list_per_page", 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, query=""):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return response.context["cl"]
+
+    def test_cursor_walks_all_rows_without_offset(self):
+        pages = []
+        query = f"?bot__id__exact={self.bot.pk}"
+        while query:
+            changelist = self.get(query)
+            pages.append([user.telegram_id for user in changelist.result_list])
+            query = changelist.next_cursor_url
+            if query:
+                self.assertNotIn("p=", query)
+                self.assertIn(f"bot__id__exact={self.bot.pk}", query)
+
+        self.assertEqual(pages, [[5, 4], [3, 2], [1]])
+
+    def test_full_page_at_the_end_links_to_empty_page(self):
+        changelist = self.get(f"?id__lt={self.users[2].pk}")
+
+        self.assertEqual([user.telegram_id for user in changelist.result_list], [2, 1])
+        self.assertEqual(self.get(changelist.next_cursor_url).result_list.count(), 0)
+
+    def test_count_comes_from_status_counters(self):
+        UserStatusCounter.objects.filter(bot=self.bot, status=UserStatus.ACTIVE).update(count=1000)
+
+        self.assertEqual(self.get().paginator.count, 1000)
+        self.assertEqual(self.get(f"?bot__id__exact={self.bot.pk}").paginator.count, 1000)
+
+    def test_search_without_bot_filter(self):
+        other_bot = Bot.objects.create(name="other", token="2:test")
+        make_user(other_bot, 3, first_name="other 3", username="same")
+        User.objects.filter(pk=self.users[2].pk).update(username="same")
+
+        for query in ("?q=3", "?q=@same"):
+            changelist = self.get(query)
+            self.assertEqual(
+                sorted(user.bot_id for user in changelist.result_list), [self.bot.pk, other_bot.pk]
+            )
+
+    def test_count_with_search_is_capped(self):
+        for telegram_id in range(1, 6):
+            User.objects.filter(pk=self.users[telegram_id - 1].pk).update(username="same")
+
+        with mock.patch.object(pagination, "COUNT_LIMIT", 3):
+            changelist = self.get("?q=same")
+
+        self.assertEqual(changelist.paginator.count, 3)
+        self.assertEqual(len(changelist.result_list), 2)
+
+
+class SpawnUpdateTests(SimpleTestCase):
+    async def test_slot_is_released_after_update(self):
+        bot_ctx = SimpleNamespace(semaphore=asyncio.Semaphore(1), tg_bot=mock.Mock(id=1))
+        update = SimpleNamespace(update_id=1)
+
+        with mock.patch("bot.bot_instance.dp.feed_update", side_effect=RuntimeError("handler")):
+            await bot_ctx.semaphore.acquire()
+            await spawn_update(bot_ctx, update)
+
+        self.assertFalse(bot_ctx.semaphore.locked())
+
+    async def test_slot_is_released_when_cancelled_before_start(self):
+        bot_ctx = SimpleNamespace(semaphore=asyncio.Semaphore(1), tg_bot=mock.Mock(id=1))
+
+        await bot_ctx.semaphore.acquire()
+        task = spawn_update(bot_ctx, SimpleNamespace(update_id=1))
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        self.assertFalse(bot_ctx.semaphore.locked())
@@ -0,0 +1,64 @@
+import heapq
+import asyncio
+import logging
+import itertools
+import contextvars
+
+logger = logging.getLogger(__name__)
+
+
+class TimerService:
+    """
+    Один фоновий таск, який викликає відкладені корутини у свій час
+    замість тисяч `asyncio.sleep` в окремих хендлерах
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._running = set()
+
+    def call_later(self, delay: float, func, *args):
+        loop = asyncio.get_running_loop()
+        heapq.heappush(self._heap, (loop.time() + delay, next(self._counter), func, args))
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            # порожній контекст: відкладені виклики не належать апдейту,
+            # який першим запустив таймер, і не мають рахуватися в його метриках
+            self._task = loop.create_task(self._run(), context=contextvars.Context())
+        else:
+            self._wakeup.set()
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._heap:
+            due = self._heap[0][0]
+            timeout = due - loop.time()
+            if timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, func, args = heapq.heappop(self._heap)
+            task = loop.create_task(self._call(func, args))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    @staticmethod
+    async def _call(func, args):
+        try:
+            await func(*args)
+        except Exception as e:
+            logger.error(f"Помилка відкладеної задачі {func.__name__}: {e}", exc_info=True)
+
+
+timer = TimerService()
@@ -0,0 +1,103 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .models import User
+from .db import db_async
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 100_000))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 600))
+
+
+@dataclass(slots=True)
+class CachedUser:
+    """
+    Легкий запис користувача для хендлерів колбеків і відправки повідомлень
+    """
+    pk: int
+    bot_id: int
+    telegram_id: int
+    bloger_id: int | None
+    status: str
+    first_name: str | None
+
+    @classmethod
+    def from_user(cls, user: User):
+        return cls(
+            pk=user.pk,
+            bot_id=user.bot_id,
+            telegram_id=user.telegram_id,
+            bloger_id=user.bloger_id,
+            status=user.status,
+            first_name=user.first_name,
+        )
+
+
+class UserCache:
+    """
+    LRU кеш (bot pk, telegram_id) -> CachedUser з обмеженим часом життя
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: int = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, bot_pk, telegram_id):
+        key = (bot_pk, telegram_id)
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, user = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return user
+
+    def put(self, user) -> CachedUser:
+        if not isinstance(user, CachedUser):
+            user = CachedUser.from_user(user)
+
+        key = (user.bot_id, user.telegram_id)
+        self._data[key] = (time.monotonic() + self.ttl, user)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return user
+
+    def set_status(self, bot_pk, telegram_id, status):
+        user = self.get(bot_pk, telegram_id)
+        if user:
+            user.status = status
+
+    def invalidate(self, bot_pk, telegram_id):
+        self._data.pop((bot_pk, telegram_id), None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+user_cache = UserCache()
+
+
+async def get_user(bot_pk, telegram_id):
+    """
+    Користувач бота з кешу, або з бази, якщо його там ще немає
+    """
+    user = user_cache.get(bot_pk, telegram_id)
+    if user:
+        return user
+
+    user = await db_async(
+        User.objects.filter(bot_id=bot_pk, telegram_id=telegram_id).first
+    )()
+    if not user:
+        return None
+    return user_cache.put(user)
@@ -1,31 +1,25 @@
 import logging
 import mimetypes
-from asgiref.sync import sync_to_async
 
 from aiogram import Bot
 from aiogram.types import Message, FSInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from .models import Bloger, User, Message as DBMessage
+from .models import Bloger, Message as DBMessage
 
 
-def get_first_message(bloger):
-    if bloger:
-        if bloger.bot.use_our_messages:
-            msg = DBMessage.objects.filter(
-                bot=bloger.bot, message_for_digits=False
-            ).first()
-        else:
-            msg = DBMessage.objects.filter(
-                folder=bloger.bot.folder, message_for_digits=False
-            ).first()
-
-        return msg
-
-
-async def send_message(message: Message, bloger: Bloger, msg_db: DBMessage = None):
+async def send_message(
+    message: Message,
+    bloger: Bloger,
+    first_message: DBMessage = None,
+    msg_db: DBMessage = None,
+):
+    """
+    `first_message` береться з кешу налаштувань бота (config_cache).
+    Повертає True, якщо повідомлення надіслано
+    """
     try:
-        msg = await sync_to_async(get_first_message)(bloger)
+        msg = first_message
         if msg_db:
             callback_data = "accept_terms"
         elif msg.send_digits:
@@ -68,9 +62,11 @@ async def send_message(message: Message, bloger: Bloger, msg_db: DBMessage = Non
             await message.answer(
                 text=msg.text, reply_markup=keyboard, parse_mode="HTML"
             )
+        return True
 
     except Exception as e:
         logging.error(f"Error sending message: {e}")
+        return False
 
 
 async def get_keyboard(text: str, link: str, callback_data: str = None):